@@ -0,0 +1,126 @@
+# Copyright (C) 2023 Victor Soupday
+# This file is part of CC/iC-Blender-Pipeline-Plugin <https://github.com/soupday/CCiC-Blender-Pipeline-Plugin>
+#
+# CC/iC-Blender-Pipeline-Plugin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC/iC-Blender-Pipeline-Plugin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC/iC-Blender-Pipeline-Plugin.  If not, see <https://www.gnu.org/licenses/>.
+
+import os, mmap, struct, json
+from . utils import log_error
+
+BAKE_MAGIC = b"BTPB"
+BAKE_HEADER_FORMAT = "!4sII"
+BAKE_ALIGN = 16
+
+
+class SequenceBake():
+    """Memory mapped cache of pre-sampled sequence frames.
+
+       File layout: [magic, complete, header size][json header][padding]
+                    [num_frames rows of row_size floats]
+
+       The header holds the cache key, which must match for the cache to be reused,
+       and the sample layout needed to unpack each row."""
+    path: str = None
+    key: dict = None
+    layout: list = None
+    start_frame: int = 0
+    num_frames: int = 0
+    row_size: int = 0
+    row_format: str = None
+    data_offset: int = 0
+    complete: bool = False
+    file = None
+    map: mmap.mmap = None
+
+    def __init__(self, path):
+        self.path = path
+
+    def create(self, key, layout, start_frame, num_frames, row_size):
+        self.close()
+        self.key = json.loads(json.dumps(key))
+        self.layout = layout
+        self.start_frame = start_frame
+        self.num_frames = num_frames
+        self.row_size = row_size
+        self.row_format = f"<{row_size}f"
+        header = bytes(json.dumps({
+            "key": self.key,
+            "layout": layout,
+            "start_frame": start_frame,
+            "num_frames": num_frames,
+            "row_size": row_size,
+        }), encoding="utf-8")
+        header_size = struct.calcsize(BAKE_HEADER_FORMAT)
+        self.data_offset = ((header_size + len(header) + BAKE_ALIGN - 1) // BAKE_ALIGN) * BAKE_ALIGN
+        size = self.data_offset + num_frames * row_size * 4
+        try:
+            self.file = open(self.path, "w+b")
+            self.file.truncate(size)
+            self.map = mmap.mmap(self.file.fileno(), size)
+            struct.pack_into(BAKE_HEADER_FORMAT, self.map, 0, BAKE_MAGIC, 0, len(header))
+            self.map[header_size:header_size + len(header)] = header
+            return True
+        except Exception as e:
+            log_error(f"Unable to create sequence cache: {self.path}", e)
+            self.close()
+            return False
+
+    def load(self, key):
+        """Maps an existing complete cache file, if it was baked with the same key"""
+        self.close()
+        if not os.path.exists(self.path):
+            return False
+        try:
+            self.file = open(self.path, "r+b")
+            self.map = mmap.mmap(self.file.fileno(), 0)
+            magic, complete, length = struct.unpack_from(BAKE_HEADER_FORMAT, self.map, 0)
+            header_size = struct.calcsize(BAKE_HEADER_FORMAT)
+            if magic == BAKE_MAGIC and complete:
+                header = json.loads(self.map[header_size:header_size + length].decode("utf-8"))
+                if header["key"] == json.loads(json.dumps(key)):
+                    self.key = header["key"]
+                    self.layout = header["layout"]
+                    self.start_frame = header["start_frame"]
+                    self.num_frames = header["num_frames"]
+                    self.row_size = header["row_size"]
+                    self.row_format = f"<{self.row_size}f"
+                    self.data_offset = ((header_size + length + BAKE_ALIGN - 1) // BAKE_ALIGN) * BAKE_ALIGN
+                    self.complete = True
+                    return True
+        except Exception as e:
+            log_error(f"Unable to read sequence cache: {self.path}", e)
+        self.close()
+        return False
+
+    def matches(self, key):
+        return self.complete and self.map is not None and self.key == json.loads(json.dumps(key))
+
+    def write_row(self, index, row):
+        struct.pack_into(self.row_format, self.map, self.data_offset + index * self.row_size * 4, *row)
+
+    def read_row(self, index):
+        return struct.unpack_from(self.row_format, self.map, self.data_offset + index * self.row_size * 4)
+
+    def finish(self):
+        struct.pack_into("!I", self.map, 4, 1)
+        self.map.flush()
+        self.complete = True
+
+    def close(self):
+        if self.map:
+            self.map.close()
+        if self.file:
+            self.file.close()
+        self.map = None
+        self.file = None
+        self.complete = False
@@ -16,7 +16,8 @@
 
 from RLPy import *
 del abs
-import os, json, math
+import os, json, math, hashlib, bisect
+from array import array
 from . import vars, utils
 from . error import ErrorCode, error_report, error_reset, error_show
 from enum import IntEnum
@@ -24,6 +25,41 @@ from enum import IntEnum
 PROJECT_FILE_NAME = None
 CALLBACK = None
 CALLBACK_ID = None
+SCENE_SESSION = utils.timestampns()
+SCENE_REVISION = 0
+# bumped only when objects are added or deleted or a file is loaded
+STRUCTURE_REVISION = 0
+# index of the scene objects by name, type and link_id, rebuilt after structural scene changes
+# or when a lookup misses after an object data change (e.g. a rename)
+SCENE_INDEX = None
+# { object id: (object name, link_id, link_id_name) }
+LINK_META_CACHE: dict = {}
+# { link_id: (skeleton signature, skin_tree, skin_bones, id_tree) }
+SKIN_TREE_CACHE: dict = {}
+# { link_id: (skeleton signature, t_pose) }, cleared on structural scene changes and file loads
+T_POSE_CACHE: dict = {}
+# { "link_id:fingerprint": { expression: { bone_name: [x, y, z, w] } } }, persisted in the DataLink cache folder
+EXPRESSION_ROTATION_CACHE: dict = None
+EXPRESSION_ROTATION_CACHE_FILE = "expression_rotations.json"
+EXPRESSION_ROTATION_CACHE_SIZE = 32
+
+FACIAL_EXPRESSION_PREFIXES = [
+    "Mouth_",
+    "Jaw_",
+    "Eye_",
+    "Right_Eyeball_",
+    "Left_Eyeball_",
+    "A25_Jaw_",
+    "Move_Jaw_",
+    "Turn_Jaw_",
+]
+
+IGNORE_EXPRESSIONS = [ "Mouth_Close" ]
+
+FACE_BONES = [ "CC_Base_JawRoot", "CC_Base_FacialBone", "CC_Base_Head",
+               "CC_Base_Tongue01", "CC_Base_Tongue02", "CC_Base_Tongue03",
+               "CC_Base_R_Eye", "CC_Base_L_Eye",
+               "CC_Base_Teeth01", "CC_Base_Teeth02", "CC_Base_UpperJaw" ]
 
 
 class BTPEventCallback(REventCallback):
@@ -32,10 +68,34 @@ class BTPEventCallback(REventCallback):
        REventCallback.__init__(self)
 
     def OnObjectDataChanged(self):
+        global SCENE_REVISION
+        SCENE_REVISION += 1
         return super().OnObjectDataChanged()
 
+    def OnObjectAdded(self):
+        global STRUCTURE_REVISION
+        STRUCTURE_REVISION += 1
+        invalidate_scene_index()
+        SKIN_TREE_CACHE.clear()
+        T_POSE_CACHE.clear()
+        return super().OnObjectAdded()
+
+    def OnObjectDeleted(self):
+        global STRUCTURE_REVISION
+        STRUCTURE_REVISION += 1
+        invalidate_scene_index()
+        SKIN_TREE_CACHE.clear()
+        T_POSE_CACHE.clear()
+        return super().OnObjectDeleted()
+
     def OnAfterFileLoadedWithPath(self, nFileType, strFilePath):
-        global PROJECT_FILE_NAME
+        global PROJECT_FILE_NAME, SCENE_REVISION, STRUCTURE_REVISION
+        SCENE_REVISION += 1
+        STRUCTURE_REVISION += 1
+        invalidate_scene_index()
+        LINK_META_CACHE.clear()
+        SKIN_TREE_CACHE.clear()
+        T_POSE_CACHE.clear()
         if nFileType == ESaveFileType_Project:
             dir, file = os.path.split(strFilePath)
             name, ext = os.path.splitext(file)
@@ -43,6 +103,16 @@ class BTPEventCallback(REventCallback):
         return super().OnAfterFileLoadedWithPath(nFileType, strFilePath)
 
 
+def get_scene_revision():
+    """Changes whenever any scene object data changes or a file is loaded"""
+    return f"{SCENE_SESSION}:{SCENE_REVISION}"
+
+
+def get_structure_revision():
+    """Changes only when scene objects are added or deleted or a file is loaded"""
+    return f"{SCENE_SESSION}:{STRUCTURE_REVISION}"
+
+
 def register(state=None):
     global PROJECT_FILE_NAME, CALLBACK, CALLBACK_ID
     if state:
@@ -1586,9 +1656,23 @@ def get_data_block_str(obj: RIObject, block_name, attr_name):
     return None
 
 
+def get_link_meta(obj: RIObject):
+    """The DataLink LinkID and LinkIDName of the object, read from its data block only when
+       not cached or when the object has been renamed since"""
+    obj_id = obj.GetID()
+    name = obj.GetName()
+    meta = LINK_META_CACHE.get(obj_id)
+    if meta is None or meta[0] != name:
+        link_id = get_data_block_str(obj, "DataLink", "LinkID")
+        link_id_name = get_data_block_str(obj, "DataLink", "LinkIDName")
+        meta = (name, link_id, link_id_name)
+        LINK_META_CACHE[obj_id] = meta
+    return meta[1], meta[2]
+
+
 def has_link_id(obj: RIObject):
     if obj:
-        link_id = get_data_block_str(obj, "DataLink", "LinkID")
+        link_id, link_id_name = get_link_meta(obj)
         if link_id:
             return True
     return False
@@ -1596,11 +1680,10 @@ def has_link_id(obj: RIObject):
 
 def validate_link_id(obj):
     if obj:
-        link_id = get_data_block_str(obj, "DataLink", "LinkID")
-        link_id_name = get_data_block_str(obj, "DataLink", "LinkIDName")
+        link_id, link_id_name = get_link_meta(obj)
         if link_id and not link_id_name:
             set_link_id(obj, link_id)
-            link_id_name = get_data_block_str(obj, "DataLink", "LinkIDName")
+            link_id, link_id_name = get_link_meta(obj)
         if link_id and link_id_name == obj.GetName():
             return True
     return False
@@ -1608,11 +1691,10 @@ def validate_link_id(obj):
 
 def get_link_id(obj: RIObject, add_if_missing=False):
     if obj:
-        link_id = get_data_block_str(obj, "DataLink", "LinkID")
-        link_id_name = get_data_block_str(obj, "DataLink", "LinkIDName")
+        link_id, link_id_name = get_link_meta(obj)
         if link_id and not link_id_name:
             set_link_id(obj, link_id)
-            link_id_name = get_data_block_str(obj, "DataLink", "LinkIDName")
+            link_id, link_id_name = get_link_meta(obj)
         if link_id and link_id_name != obj.GetName():
             link_id = utils.random_string(20, lower_case=False)
             utils.log_info(f"Object Name changed ({link_id_name} => {obj.GetName()}), assigning new link ID: {link_id}")
@@ -1634,33 +1716,125 @@ def set_link_id(obj: RIObject, link_id):
         link_id_name_value = RVariant(obj.GetName())
         data_block.SetData("LinkID", link_id_value)
         data_block.SetData("LinkIDName", link_id_name_value)
+        LINK_META_CACHE[obj.GetID()] = (obj.GetName(), str(link_id), obj.GetName())
+        if SCENE_INDEX is not None:
+            SCENE_INDEX.add_link_id(obj, link_id)
+
+
+class SceneIndex():
+    """The sendable scene objects indexed by id, name and link_id, with their types and
+       child (prop & accessory) objects resolved on demand.
+       Built once per operation so that many lookups don't each scan the whole scene."""
+    objects: list = None
+    by_id: dict = None
+    by_name: dict = None
+    by_link_id: dict = None
+    types: dict = None
+    child_objects: dict = None
+    revision: int = 0
 
+    def __init__(self):
+        self.build()
+
+    def build(self):
+        self.revision = SCENE_REVISION
+        self.objects = []
+        self.by_id = {}
+        self.by_name = {}
+        self.by_link_id = {}
+        self.types = {}
+        self.child_objects = {}
+        objects = RScene.FindObjects(EObjectType_Avatar | EObjectType_LightAvatar |
+                                     EObjectType_Prop | EObjectType_MDProp |
+                                     EObjectType_Light | EObjectType_DirectionalLight |
+                                     EObjectType_SpotLight | EObjectType_PointLight |
+                                     EObjectType_Camera)
+        for obj in objects:
+            obj_id = obj.GetID()
+            if obj_id in self.by_id:
+                continue
+            self.by_id[obj_id] = obj
+            self.objects.append(obj)
+            # names are not unique, keep them in scene order
+            self.by_name.setdefault(obj.GetName(), []).append(obj)
+            if has_link_id(obj):
+                self.by_link_id[get_link_id(obj)] = obj
+
+    def get_type(self, obj):
+        obj_id = obj.GetID()
+        T = self.types.get(obj_id)
+        if T is None:
+            T = get_object_type(obj)
+            self.types[obj_id] = T
+        return T
 
-def find_object_by_link_id(link_id):
-    objects = RScene.FindObjects(EObjectType_Avatar | EObjectType_LightAvatar |
-                                 EObjectType_Prop | EObjectType_MDProp |
-                                 EObjectType_Light | EObjectType_DirectionalLight |
-                                 EObjectType_SpotLight | EObjectType_PointLight |
-                                 EObjectType_Camera)
-    for obj in objects:
-        if get_link_id(obj) == link_id:
-            return obj
-    return None
+    def get_child_objects(self, obj):
+        obj_id = obj.GetID()
+        child_objects = self.child_objects.get(obj_id)
+        if child_objects is None:
+            child_objects = RScene.FindChildObjects(obj, EObjectType_Prop | EObjectType_Accessory)
+            self.child_objects[obj_id] = child_objects
+        return child_objects
+
+    def add_link_id(self, obj, link_id):
+        self.by_link_id[str(link_id)] = obj
+
+    def find_by_link_id(self, link_id):
+        obj = self.by_link_id.get(link_id)
+        if obj:
+            # the object may have been renamed or re-assigned since the index was built
+            try:
+                valid = get_link_id(obj) == link_id
+            except:
+                valid = False
+            if not valid:
+                self.build()
+                obj = self.by_link_id.get(link_id)
+        elif self.revision != SCENE_REVISION:
+            self.build()
+            obj = self.by_link_id.get(link_id)
+        return obj
+
+    def find_by_name_and_type(self, search_name, search_type=None):
+        for obj in self.by_name.get(search_name, []):
+            if not search_type or self.get_type(obj) == search_type:
+                try:
+                    valid = obj.GetName() == search_name
+                except:
+                    valid = False
+                if not valid:
+                    self.build()
+                    return self.find_by_name_and_type(search_name, search_type)
+                return obj
+        # objects may have been renamed since the index was built
+        if self.revision != SCENE_REVISION:
+            self.build()
+            return self.find_by_name_and_type(search_name, search_type)
+        return None
 
 
-def find_object_by_name_and_type(search_name, search_type=None) -> RIObject:
-    objects = RScene.FindObjects(EObjectType_Avatar | EObjectType_LightAvatar |
-                                 EObjectType_Prop | EObjectType_MDProp |
-                                 EObjectType_Light | EObjectType_DirectionalLight |
-                                 EObjectType_SpotLight | EObjectType_PointLight |
-                                 EObjectType_Camera)
-    for obj in objects:
-        if obj.GetName() == search_name:
-            if search_type:
-                if get_object_type(obj) == search_type:
-                    return obj
-            else:
-                return obj
+def invalidate_scene_index():
+    global SCENE_INDEX
+    SCENE_INDEX = None
+
+
+def get_scene_index() -> SceneIndex:
+    global SCENE_INDEX
+    if SCENE_INDEX is None:
+        SCENE_INDEX = SceneIndex()
+    return SCENE_INDEX
+
+
+def find_object_by_link_id(link_id, scene_index: SceneIndex=None):
+    if not scene_index:
+        scene_index = get_scene_index()
+    return scene_index.find_by_link_id(link_id)
+
+
+def find_object_by_name_and_type(search_name, search_type=None, scene_index: SceneIndex=None) -> RIObject:
+    if not scene_index:
+        scene_index = get_scene_index()
+    return scene_index.find_by_name_and_type(search_name, search_type)
 
 
 def get_avatar_type_name(avatar: RIAvatar):
@@ -1685,6 +1859,148 @@ def get_avatar_profile_name(avatar: RIAvatar):
     return profile_type_string
 
 
+def is_face_expression(expression):
+    for face_prefix in FACIAL_EXPRESSION_PREFIXES:
+        if expression.startswith(face_prefix):
+            return True
+    return False
+
+
+def get_facial_profile_fingerprint(avatar: RIAvatar, expressions, bones):
+    profile_type_string = "None"
+    if hasattr(avatar, "GetFacialProfileComponent"):
+        try:
+            profile_type_string = get_avatar_profile_name(avatar)
+        except:
+            pass
+    fingerprint = "|".join([ profile_type_string, ",".join(expressions), ",".join(b.GetName() for b in bones) ])
+    return hashlib.md5(fingerprint.encode("utf-8")).hexdigest()
+
+
+def get_expression_bone_rotation(FC: RIFaceComponent, bone_name, expression):
+    try:
+        ERM: RMatrix3 = FC.GetExpressionBoneRotation(bone_name, expression)
+    except:
+        ERM = RMatrix3(1, 0, 0,
+                       0, 1, 0,
+                       0, 0, 1)
+    ERQ = RQuaternion()
+    ERQ.FromRotationMatrix(ERM)
+    return ERQ
+
+
+def get_expression_rotation_entry(FC: RIFaceComponent, bone_name, expression):
+    """The [x, y, z, w] expression bone rotation, or None if it rotates less than 0.1 degrees"""
+    ERQ = get_expression_bone_rotation(FC, bone_name, expression)
+    euler_angle_x, euler_angle_y, euler_angle_z = quaternion_to_euler_xyz(ERQ, degrees=True)
+    t = abs(euler_angle_x) + abs(euler_angle_y) + abs(euler_angle_z)
+    if t > 0.1:
+        return quaternion_to_array(ERQ)
+    return None
+
+
+def scan_expression_bone_rotations(FC: RIFaceComponent, expressions, bones):
+    """{ expression: { bone_name: [x, y, z, w] } } of every expression bone rotation of more than 0.1 degrees,
+       facial expressions only rotate the face bones"""
+    table = {}
+    bone_names = [ bone.GetName() for bone in bones ]
+    for expression in expressions:
+        if expression in IGNORE_EXPRESSIONS:
+            continue
+        is_face = is_face_expression(expression)
+        for bone_name in bone_names:
+            if is_face and bone_name not in FACE_BONES:
+                continue
+            rotation = get_expression_rotation_entry(FC, bone_name, expression)
+            if rotation:
+                table.setdefault(expression, {})[bone_name] = rotation
+    return table
+
+
+def validate_expression_bone_rotations(FC: RIFaceComponent, table: dict, expressions, bones):
+    """Re-reads every cached rotation and every face bone rotation of every expression,
+       to catch edits to the expressions that keep the same profile. This covers all the bones
+       the facial expressions can rotate, for a fraction of the reads of a full scan."""
+    bone_names = set(bone.GetName() for bone in bones)
+    face_bones = [ bone_name for bone_name in FACE_BONES if bone_name in bone_names ]
+    for expression in expressions:
+        if expression in IGNORE_EXPRESSIONS:
+            continue
+        bone_rotations = table.get(expression, {})
+        check_bones = list(bone_rotations)
+        check_bones.extend(bone_name for bone_name in face_bones if bone_name not in bone_rotations)
+        for bone_name in check_bones:
+            q = get_expression_rotation_entry(FC, bone_name, expression)
+            rotation = bone_rotations.get(bone_name)
+            if (q is None) != (rotation is None):
+                return False
+            # q and -q are the same rotation
+            if q is not None and abs(sum(a * b for a, b in zip(q, rotation))) < 0.9999:
+                return False
+    return True
+
+
+def get_expression_rotation_cache(datalink_folder):
+    global EXPRESSION_ROTATION_CACHE
+    if EXPRESSION_ROTATION_CACHE is None:
+        EXPRESSION_ROTATION_CACHE = {}
+        if datalink_folder:
+            cache_path = os.path.join(datalink_folder, "cache", EXPRESSION_ROTATION_CACHE_FILE)
+            try:
+                if os.path.exists(cache_path):
+                    with open(cache_path, "r") as read_file:
+                        EXPRESSION_ROTATION_CACHE = json.load(read_file)
+            except Exception as e:
+                utils.log_error(f"Unable to read expression rotation cache: {cache_path}", e)
+    return EXPRESSION_ROTATION_CACHE
+
+
+def write_expression_rotation_cache(datalink_folder):
+    cache_folder = utils.make_sub_folder(datalink_folder, "cache") if datalink_folder and os.path.exists(datalink_folder) else None
+    if cache_folder:
+        cache_path = os.path.join(cache_folder, EXPRESSION_ROTATION_CACHE_FILE)
+        try:
+            with open(cache_path, "w") as write_file:
+                json.dump(EXPRESSION_ROTATION_CACHE, write_file)
+        except Exception as e:
+            utils.log_error(f"Unable to write expression rotation cache: {cache_path}", e)
+
+
+def get_expression_bone_rotations(avatar: RIAvatar, datalink_folder=None, add_link_id=True):
+    """The expression bone rotation table of the avatar: { expression: { bone_name: [x, y, z, w] } },
+       scanned from the face component only the first time for each avatar and facial profile,
+       and kept in the DataLink cache folder across sessions.
+       Without add_link_id, an avatar with no link id is scanned but not cached."""
+    FC: RIFaceComponent = avatar.GetFaceComponent()
+    SC = safe_get_skeleton_component(avatar)
+    if not FC or not SC:
+        return {}
+    expressions = FC.GetExpressionNames("") or []
+    bones = SC.GetSkinBones()
+    if add_link_id:
+        link_id = get_link_id(avatar, add_if_missing=True)
+    else:
+        # read only: a missing or stale link id is not written
+        link_id, link_id_name = get_link_meta(avatar)
+        if link_id_name != avatar.GetName():
+            link_id = None
+    if not link_id:
+        return scan_expression_bone_rotations(FC, expressions, bones)
+    cache = get_expression_rotation_cache(datalink_folder)
+    key = f"{link_id}:{get_facial_profile_fingerprint(avatar, expressions, bones)}"
+    table = cache.get(key)
+    if table is not None and validate_expression_bone_rotations(FC, table, expressions, bones):
+        return table
+    utils.log_info(f"Scanning expression bone rotations: {avatar.GetName()}")
+    table = scan_expression_bone_rotations(FC, expressions, bones)
+    cache.pop(key, None)
+    cache[key] = table
+    while len(cache) > EXPRESSION_ROTATION_CACHE_SIZE:
+        cache.pop(next(iter(cache)))
+    write_expression_rotation_cache(datalink_folder)
+    return table
+
+
 def is_avatar_hik(avatar: RIAvatar):
     return is_avatar_standard(avatar) or is_avatar_non_standard(avatar)
 
@@ -1803,11 +2119,12 @@ def deduplicate_scene_objects():
                                  EObjectType_SpotLight | EObjectType_PointLight |
                                  EObjectType_Camera)
     names = {}
-    ids_done = []
+    ids_done = set()
+    renamed = False
     for obj in objects:
         obj_id = obj.GetID()
         if obj_id not in ids_done:
-            ids_done.append(obj_id)
+            ids_done.add(obj_id)
             name = obj.GetName()
             if name not in names:
                 names[name] = 1
@@ -1816,6 +2133,9 @@ def deduplicate_scene_objects():
                 count = names[name]
                 names[name] += 1
                 obj.SetName(f"{name}_{count:03d}")
+                renamed = True
+    if renamed:
+        invalidate_scene_index()
 
 
 def get_mesh_skin_bones(obj, skin_bones):
@@ -1869,9 +2189,13 @@ def safe_get_skeleton_component(obj: RIObject) -> RISkeletonComponent:
         return None
 
 
-def get_extended_skin_bones_tree(avatar_or_prop: RIObject):
+def get_extended_skin_bones_tree(avatar_or_prop: RIObject, scene_index: SceneIndex=None, child_objects: list=None):
 
-    child_objects: list = RScene.FindChildObjects(avatar_or_prop, EObjectType_Prop | EObjectType_Accessory)
+    if child_objects is None:
+        if scene_index:
+            child_objects = scene_index.get_child_objects(avatar_or_prop)
+        else:
+            child_objects = RScene.FindChildObjects(avatar_or_prop, EObjectType_Prop | EObjectType_Accessory)
     objects = [avatar_or_prop]
     objects.extend(child_objects)
 
@@ -1931,6 +2255,44 @@ def get_extended_skin_bones_tree(avatar_or_prop: RIObject):
         return None
 
 
+def get_skin_tree_signature(obj: RIObject, child_objects: list):
+    """Cheap structural signature of the extended skeleton: the object's skin bone count and root bone name
+       and the id and skin bone count of each child object attached to it"""
+    SC = safe_get_skeleton_component(obj)
+    if SC:
+        root = SC.GetRootBone()
+        children = []
+        for child in child_objects:
+            child_SC = safe_get_skeleton_component(child)
+            children.append((child.GetID(), len(child_SC.GetSkinBones()) if child_SC else 0))
+        return (len(SC.GetSkinBones()), root.GetName() if root else None, tuple(children))
+    return None
+
+
+def get_cached_skin_bones_tree(obj: RIObject, scene_index: SceneIndex=None):
+    """The extended skin bone tree of the object and its extracted skin bones and id tree (without transforms),
+       walked again only after a structural scene change or when the skeleton signature changes."""
+    # attaching or detaching props is not a structural scene event, so the children are always looked up,
+    # from the operation's scene snapshot if there is one
+    if scene_index:
+        child_objects = scene_index.get_child_objects(obj)
+    else:
+        child_objects = RScene.FindChildObjects(obj, EObjectType_Prop | EObjectType_Accessory)
+    signature = get_skin_tree_signature(obj, child_objects)
+    link_id = get_link_id(obj, add_if_missing=True) if signature else None
+    if link_id:
+        cached = SKIN_TREE_CACHE.get(link_id)
+        if cached and cached[0] == signature:
+            return cached[1], cached[2], cached[3]
+    skin_tree = get_extended_skin_bones_tree(obj, child_objects=child_objects)
+    if not skin_tree:
+        return None, [], {}
+    skin_bones, id_tree = extract_extended_skin_bones(skin_tree)
+    if link_id:
+        SKIN_TREE_CACHE[link_id] = (signature, skin_tree, skin_bones, id_tree)
+    return skin_tree, skin_bones, id_tree
+
+
 def extract_extended_skin_bones(bone_def: dict, skin_bones: list=None, include_transforms=False):
     if skin_bones is None:
         skin_bones = []
@@ -2157,58 +2519,124 @@ def end_timeline_scan(current_time):
     RGlobal.SetTime(current_time)
 
 
+# the per frame animated properties of lights and cameras, as written to the .rlx frames:
+# (key, struct format code, number of values)
+LIGHT_FRAME_COLUMNS = [
+    ("active", "?", 1),
+    ("loc", "f", 3),
+    ("rot", "f", 4),
+    ("sca", "f", 3),
+    ("color", "f", 3),
+    ("multiplier", "f", 1),
+    ("range", "f", 1),
+    ("angle", "f", 1),
+    ("falloff", "f", 1),
+    ("attenuation", "f", 1),
+    ("darkness", "f", 1),
+]
+
+CAMERA_FRAME_COLUMNS = [
+    ("loc", "f", 3),
+    ("rot", "f", 4),
+    ("sca", "f", 3),
+    ("focal_length", "f", 1),
+    ("dof_enable", "?", 1),
+    ("dof_focus", "f", 1),
+    ("dof_range", "f", 1),
+    ("dof_far_blur", "f", 1),
+    ("dof_near_blur", "f", 1),
+    ("dof_far_transition", "f", 1),
+    ("dof_near_transition", "f", 1),
+    ("dof_min_blend_distance", "f", 1),
+    ("fov", "f", 1),
+    ("active", "?", 1),
+]
+
+
+def new_frame_columns(layout):
+    return { key: array("b" if code == "?" else "f") for key, code, count in layout }
+
+
+def append_frame_columns(columns: dict, layout, data: dict):
+    for key, code, count in layout:
+        if count == 1:
+            columns[key].append(data[key])
+        else:
+            columns[key].extend(data[key])
+
+
+def new_timeline_object(static_data: dict, layout):
+    return { "data": static_data, "columns": new_frame_columns(layout) }
+
+
+def add_timeline_frame(timeline_object: dict, layout, animated_data: dict, first=False):
+    """Adds one frame of the object's animated data to its columns,
+       the first frame also completes its (static) data"""
+    if first:
+        timeline_object["data"].update(animated_data)
+    append_frame_columns(timeline_object["columns"], layout, animated_data)
+
+
 def get_all_camera_light_data(no_animation=False, fps: RFps=None):
+    """Samples the lights and cameras over the timeline (or just the current frame) into columns:
+       { "times": array, "frames": array,
+         "lights": { link_id: { "data": first frame light data, "columns": { key: array } } },
+         "cameras": { link_id: { "data": first frame camera data, "columns": { key: array } } } }
+       with the columns of LIGHT_FRAME_COLUMNS and CAMERA_FRAME_COLUMNS, flattened for multi-value keys"""
     lights = RScene.FindObjects(EObjectType_Light | EObjectType_DirectionalLight |
                                 EObjectType_SpotLight | EObjectType_PointLight)
     cameras = RScene.FindObjects(EObjectType_Camera)
     if not fps:
         fps: RFps = RGlobal.GetFps()
-    switch_data = RScene.GetSwitchCameraFrameIndexs(fps)
-    all_data = []
-    if lights or cameras:
+    switch_intervals = get_camera_switch_intervals(fps)
+    times = array("q")
+    frames = array("q")
+    timeline_lights = {}
+    timeline_cameras = {}
+    all_data = {
+        "times": times,
+        "frames": frames,
+        "lights": timeline_lights,
+        "cameras": timeline_cameras,
+    }
+    # the static properties are read once, only the animated ones each frame
+    timeline_light_objects = []
+    for light in lights:
+        light_data = get_light_static_data(light)
+        if light_data:
+            timeline_object = new_timeline_object(light_data, LIGHT_FRAME_COLUMNS)
+            timeline_lights[light_data["link_id"]] = timeline_object
+            timeline_light_objects.append((light, light_data["type"], timeline_object))
+    timeline_camera_objects = []
+    for camera in cameras:
+        camera_data = get_camera_static_data(camera)
+        if camera_data:
+            timeline_object = new_timeline_object(camera_data, CAMERA_FRAME_COLUMNS)
+            timeline_cameras[camera_data["link_id"]] = timeline_object
+            timeline_camera_objects.append((camera, timeline_object))
+    if timeline_light_objects or timeline_camera_objects:
         if no_animation:
             time = RGlobal.GetTime()
             frame = fps.GetFrameIndex(time)
-            frame_lights = []
-            frame_cameras = []
-            frame_data = {
-                "time": time.ToInt(),
-                "frame": int(frame),
-                "lights": frame_lights,
-                "cameras": frame_cameras,
-            }
-            for light in lights:
-                light_data = get_light_data(light)
-                if light_data:
-                    frame_lights.append(light_data)
-            for camera in cameras:
-                camera_data = get_camera_data(camera, fps, frame, switch_data)
-                if camera_data:
-                    frame_cameras.append(camera_data)
-            all_data.append(frame_data)
         else:
             time, frame = begin_timeline_scan(fps)
             start_time = time
-            is_next = True
-            while is_next:
-                frame_lights = []
-                frame_cameras = []
-                frame_data = {
-                    "time": time.ToInt(),
-                    "frame": int(frame),
-                    "lights": frame_lights,
-                    "cameras": frame_cameras,
-                }
-                for light in lights:
-                    light_data = get_light_data(light)
-                    if light_data:
-                        frame_lights.append(light_data)
-                for camera in cameras:
-                    camera_data = get_camera_data(camera, fps, frame, switch_data)
-                    if camera_data:
-                        frame_cameras.append(camera_data)
-                all_data.append(frame_data)
-                is_next, time, frame = next_timeline_scan(fps)
+        while True:
+            first = len(times) == 0
+            times.append(time.ToInt())
+            frames.append(int(frame))
+            for light, light_type, timeline_object in timeline_light_objects:
+                light_data = get_light_animated_data(light, light_type)
+                add_timeline_frame(timeline_object, LIGHT_FRAME_COLUMNS, light_data, first)
+            for camera, timeline_object in timeline_camera_objects:
+                camera_data = get_camera_animated_data(camera, frame, switch_intervals)
+                add_timeline_frame(timeline_object, CAMERA_FRAME_COLUMNS, camera_data, first)
+            if no_animation:
+                break
+            is_next, time, frame = next_timeline_scan(fps)
+            if not is_next:
+                break
+        if not no_animation:
             end_timeline_scan(start_time)
     return all_data
 
@@ -2347,39 +2775,23 @@ def restore_scene_selection(store: tuple):
         RScene.SelectObjects(selection)
 
 
-def get_light_data(light: RILight):
-    spot_light: RISpotLight = None
-    dir_light: RIDirectionalLight = None
-    point_light: RIPointLight = None
-    light_type = "NONE"
+def get_light_type(light: RILight):
     T = type(light)
     if T is RISpotLight:
-        spot_light = light
-        light_type = "SPOT"
+        return "SPOT"
     elif T is RIPointLight:
-        point_light = light
-        light_type = "POINT"
+        return "POINT"
     elif T is RIDirectionalLight:
-        dir_light = light
-        light_type = "DIR"
-    else:
-        return None
+        return "DIR"
+    return None
 
-    T:RTransform = light.WorldTransform()
-    t: RVector3 = T.T()
-    r: RQuaternion = T.R()
-    s: RVector3 = T.S()
 
-    link_id: str = get_link_id(light, add_if_missing=True)
-    active: bool = light.GetActive()
-    color: RRgb = light.GetColor()
-    multiplier: float = light.GetMultiplier()
-    current_time = RGlobal.GetTime()
+def get_light_static_data(light: RILight):
+    """The light properties that don't change over a shot (and aren't written per frame)"""
+    light_type = get_light_type(light)
+    if not light_type:
+        return None
 
-    light_range: float = 1000.0
-    angle: float = 60.0
-    falloff: float = 100.0
-    attenuation: float = 100.0
     transmission: bool = False
     is_tube: bool = False
     tube_length: float = 0.0
@@ -2387,16 +2799,10 @@ def get_light_data(light: RILight):
     tube_soft_radius: float = 0.0
     is_rectangle: bool = False
     rect: RVector2 = RVector2(0,0)
-    cast_shadow: bool = False
     inverse_square: bool = False
-    darkness: float = 0.0
 
-    if spot_light:
-        light_range = spot_light.GetRange()
-        try:
-            status, angle, falloff, attenuation = spot_light.GetSpotLightBeam(angle, falloff, attenuation)
-        except:
-            error_report(ErrorCode.SPOTLIGHT_01)
+    if light_type == "SPOT":
+        spot_light: RISpotLight = light
         transmission = spot_light.GetTransmission()
         inverse_square = spot_light.GetInverseSquare()
         is_tube = spot_light.IsTubeShape()
@@ -2405,10 +2811,9 @@ def get_light_data(light: RILight):
         tube_soft_radius = spot_light.GetTubeSoftRadius()
         is_rectangle = spot_light.IsRectangleShape()
         rect = spot_light.GetRectWidthHeight()
-        darkness = spot_light.GetDarkenShadowStrength()
 
-    if point_light:
-        light_range = point_light.GetRange()
+    elif light_type == "POINT":
+        point_light: RIPointLight = light
         inverse_square = point_light.GetInverseSquare()
         is_tube = point_light.IsTubeShape()
         tube_length = point_light.GetTubeLength()
@@ -2417,26 +2822,14 @@ def get_light_data(light: RILight):
         is_rectangle = point_light.IsRectangleShape()
         rect = point_light.GetRectWidthHeight()
 
-    elif dir_light:
+    elif light_type == "DIR":
+        dir_light: RIDirectionalLight = light
         transmission = dir_light.GetTransmission()
-        darkness = dir_light.GetDarkenShadowStrength()
 
-    cast_shadow = light.IsCastShadow()
-
-    light_data = {
-        "link_id": link_id,
+    return {
+        "link_id": get_link_id(light, add_if_missing=True),
         "name": light.GetName(),
-        "loc": [t.x, t.y, t.z],
-        "rot": [r.x, r.y, r.z, r.w],
-        "sca": [s.x, s.y, s.z],
-        "active": active,
-        "color": [color.R(), color.G(), color.B()],
-        "multiplier": multiplier,
         "type": light_type,
-        "range": light_range,
-        "angle": angle,
-        "falloff": falloff,
-        "attenuation": attenuation,
         "inverse_square": inverse_square,
         "transmission": transmission,
         "is_tube": is_tube,
@@ -2445,33 +2838,84 @@ def get_light_data(light: RILight):
         "tube_soft_radius": tube_soft_radius,
         "is_rectangle": is_rectangle,
         "rect": [rect.x, rect.y],
-        "cast_shadow": cast_shadow,
+        "cast_shadow": light.IsCastShadow(),
+    }
+
+
+def get_light_animated_data(light: RILight, light_type):
+    """The light transform and the animateable light properties at the current time"""
+    T:RTransform = light.WorldTransform()
+    t: RVector3 = T.T()
+    r: RQuaternion = T.R()
+    s: RVector3 = T.S()
+
+    color: RRgb = light.GetColor()
+    light_range: float = 1000.0
+    angle: float = 60.0
+    falloff: float = 100.0
+    attenuation: float = 100.0
+    darkness: float = 0.0
+
+    if light_type == "SPOT":
+        spot_light: RISpotLight = light
+        light_range = spot_light.GetRange()
+        try:
+            status, angle, falloff, attenuation = spot_light.GetSpotLightBeam(angle, falloff, attenuation)
+        except:
+            error_report(ErrorCode.SPOTLIGHT_01)
+        darkness = spot_light.GetDarkenShadowStrength()
+
+    elif light_type == "POINT":
+        point_light: RIPointLight = light
+        light_range = point_light.GetRange()
+
+    elif light_type == "DIR":
+        dir_light: RIDirectionalLight = light
+        darkness = dir_light.GetDarkenShadowStrength()
+
+    return {
+        "loc": [t.x, t.y, t.z],
+        "rot": [r.x, r.y, r.z, r.w],
+        "sca": [s.x, s.y, s.z],
+        "active": light.GetActive(),
+        "color": [color.R(), color.G(), color.B()],
+        "multiplier": light.GetMultiplier(),
+        "range": light_range,
+        "angle": angle,
+        "falloff": falloff,
+        "attenuation": attenuation,
         "darkness": darkness,
     }
 
+
+def get_light_data(light: RILight):
+    light_data = get_light_static_data(light)
+    if light_data:
+        light_data.update(get_light_animated_data(light, light_data["type"]))
     return light_data
 
 
-def is_camera_switch_active(camera: RICamera, frame, switch_data):
-    """Assumes switch frames are in frame order ..."""
-    active_obj = None
-    for switch_obj, switch_frame in switch_data:
-        if frame >= switch_frame:
-            active_obj = switch_obj
-    if active_obj:
-        return active_obj.GetID() == camera.GetID()
+def get_camera_switch_intervals(fps: RFps):
+    """The camera switch frames, in frame order, and the id of the camera switched to at each:
+       ([frame, ...], [camera id, ...])"""
+    switch_data = RScene.GetSwitchCameraFrameIndexs(fps)
+    switches = sorted(((switch_frame, switch_obj.GetID()) for switch_obj, switch_frame in switch_data if switch_obj),
+                      key=lambda switch: switch[0])
+    return [ switch[0] for switch in switches ], [ switch[1] for switch in switches ]
+
+
+def is_camera_switch_active(camera: RICamera, frame, switch_intervals):
+    switch_frames, switch_ids = switch_intervals
+    i = bisect.bisect_right(switch_frames, frame) - 1
+    if i >= 0:
+        return switch_ids[i] == camera.GetID()
     return False
 
 
-def get_camera_data(camera: RICamera, fps: RFps, frame, switch_data = None):
-    if switch_data is None:
-        switch_data = RScene.GetSwitchCameraFrameIndexs(fps)
-    T = type(camera)
-    if T is not RICamera:
+def get_camera_static_data(camera: RICamera):
+    """The camera properties that don't change over a shot (and aren't written per frame)"""
+    if type(camera) is not RICamera:
         return None
-    link_id = get_link_id(camera, add_if_missing=True)
-    name = camera.GetName()
-    time = RGlobal.GetTime()
     width = 0
     height = 0
     res = camera.GetAperture(width, height)
@@ -2481,58 +2925,58 @@ def get_camera_data(camera: RICamera, fps: RFps, frame, switch_data = None):
     pos = RVector3()
     rot = RVector3()
     camera.GetPivot(pos, rot)
-    focal_length = camera.GetFocalLength(time)
-    fov = camera.GetAngleOfView(time)
     fit_fov = ("HORIZONTAL" if camera.GetFitFovType() == ECameraFitResolution_Horizontal
                         else "VERTICAL")
     fit = ("HORIZONTAL" if camera.GetFitRenderRegionType() == ECameraFitResolution_Horizontal
                         else "VERTICAL")
-    far_clip = camera.GetFarClippingPlane()
-    near_clip = camera.GetNearClippingPlane()
-    is_look_at = camera.IsLookAtMode(time)
     dof_data: RCameraDofData = camera.GetDOFData()
-    dof_enable = dof_data.GetEnable()
-    dof_weight = dof_data.GetCenterColorWeight()
-    dof_decay = dof_data.GetEdgeDecayPower()
-    dof_far_blur = dof_data.GetFarBlurScale()
-    dof_near_blur = dof_data.GetNearBlurScale()
-    dof_far_transition = dof_data.GetFarTransitionRegion()
-    dof_near_transition = dof_data.GetNearTransitionRegion()
-    dof_focus = dof_data.GetFocus()
-    dof_min_blend_distance = dof_data.GetMinBlendDistance()
-    dof_range = dof_data.GetRange()
-    active = is_camera_switch_active(camera, frame, switch_data)
+    return {
+        "link_id": get_link_id(camera, add_if_missing=True),
+        "name": camera.GetName(),
+        "fit": fit,
+        "fit_fov": fit_fov,
+        "width": width,
+        "height": height,
+        "far_clip": camera.GetFarClippingPlane(),
+        "near_clip": camera.GetNearClippingPlane(),
+        "pos": [pos.x, pos.y, pos.z],
+        "dof_weight": dof_data.GetCenterColorWeight(),  # Unknown?
+        "dof_decay": dof_data.GetEdgeDecayPower(),      # Unknown?
+    }
+
+
+def get_camera_animated_data(camera: RICamera, frame, switch_intervals):
+    """The camera transform and the animateable camera properties at the current time"""
+    time = RGlobal.GetTime()
+    dof_data: RCameraDofData = camera.GetDOFData()
     T: RTransform = camera.WorldTransform()
     t: RVector3 = T.T()
     r: RQuaternion = T.R()
     s: RVector3 = T.S()
-    camera_data = {
-        "link_id": link_id,
-        "name": name,
+    return {
         "loc": [t.x, t.y, t.z],
         "rot": [r.x, r.y, r.z, r.w],
         "sca": [s.x, s.y, s.z],
-        "fov": fov,
-        "fit": fit,
-        "fit_fov": fit_fov,
-        "width": width,
-        "height": height,
-        "focal_length": focal_length,
-        "far_clip": far_clip,
-        "near_clip": near_clip,
-        "pos": [pos.x, pos.y, pos.z],
-        "dof_enable": dof_enable,
-        "dof_weight": dof_weight,           # Unknown?
-        "dof_decay": dof_decay,             # Unknown?
-        "dof_focus": dof_focus,             # Focus Distance
-        "dof_range": dof_range,             # Perfect Focus Range
-        "dof_far_blur": dof_far_blur,
-        "dof_near_blur": dof_near_blur,
-        "dof_far_transition": dof_far_transition,
-        "dof_near_transition": dof_near_transition,
-        "dof_min_blend_distance": dof_min_blend_distance, # Blur Edge Sampling Scale
-        "active": active,
+        "fov": camera.GetAngleOfView(time),
+        "focal_length": camera.GetFocalLength(time),
+        "dof_enable": dof_data.GetEnable(),
+        "dof_focus": dof_data.GetFocus(),                       # Focus Distance
+        "dof_range": dof_data.GetRange(),                       # Perfect Focus Range
+        "dof_far_blur": dof_data.GetFarBlurScale(),
+        "dof_near_blur": dof_data.GetNearBlurScale(),
+        "dof_far_transition": dof_data.GetFarTransitionRegion(),
+        "dof_near_transition": dof_data.GetNearTransitionRegion(),
+        "dof_min_blend_distance": dof_data.GetMinBlendDistance(), # Blur Edge Sampling Scale
+        "active": is_camera_switch_active(camera, frame, switch_intervals),
     }
+
+
+def get_camera_data(camera: RICamera, fps: RFps, frame, switch_intervals = None):
+    camera_data = get_camera_static_data(camera)
+    if camera_data:
+        if switch_intervals is None:
+            switch_intervals = get_camera_switch_intervals(fps)
+        camera_data.update(get_camera_animated_data(camera, frame, switch_intervals))
     return camera_data
 
 
@@ -22,10 +22,43 @@ from PySide2.QtGui import *
 from shiboken2 import wrapInstance
 import os, struct, json
 from . import utils, cc, qt, options
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 RLX_ID_LIGHT = 0xCC01
 RLX_ID_CAMERA = 0xCC02
 
+
+def pack_frame_columns(times, frames, columns: dict, layout):
+    """Packs the .rlx frames (time, frame, then the layout's values) from whole columns,
+       as one structured big-endian array with NumPy, otherwise as one struct.pack"""
+    num_frames = len(times)
+    if np is not None:
+        fields = [ ("time", ">u4"), ("frame", ">u4") ]
+        for key, code, count in layout:
+            fields.append((key, "?" if code == "?" else ">f4", (count,)))
+        data = np.empty(num_frames, dtype=np.dtype(fields))
+        data["time"] = times
+        data["frame"] = frames
+        for key, code, count in layout:
+            column = np.frombuffer(columns[key], dtype=np.int8 if code == "?" else np.float32)
+            data[key] = column.reshape(num_frames, count)
+        return data.tobytes()
+    frame_format = "II" + "".join(code * count for key, code, count in layout)
+    layout_columns = [ (columns[key], count) for key, code, count in layout ]
+    values = []
+    for i in range(0, num_frames):
+        values.append(times[i])
+        values.append(frames[i])
+        for column, count in layout_columns:
+            if count == 1:
+                values.append(column[i])
+            else:
+                values.extend(column[i*count:(i+1)*count])
+    return struct.pack("!" + frame_format * num_frames, *values)
+
 class ExporterEventCallback(REventCallback):
 
     target = None
@@ -1085,58 +1118,18 @@ class Exporter:
             SC = cc.safe_get_skeleton_component(self.avatar)
             if not expression_data and FC and SC:
 
-                FACIAL_EXPRESSION_PREFIXES = [
-                    "Mouth_",
-                    "Jaw_",
-                    "Eye_",
-                    "Right_Eyeball_",
-                    "Left_Eyeball_",
-                    "A25_Jaw_",
-                    "Move_Jaw_",
-                    "Turn_Jaw_",
-                ]
-
-                IGNORE_EXPRESSIONS = [ "Mouth_Close" ]
-
-                FACE_BONES = [ "CC_Base_JawRoot", "CC_Base_FacialBone", "CC_Base_Head",
-                               "CC_Base_Tongue01", "CC_Base_Tongue02", "CC_Base_Tongue03",
-                               "CC_Base_R_Eye", "CC_Base_L_Eye",
-                               "CC_Base_Teeth01", "CC_Base_Teeth02", "CC_Base_UpperJaw" ]
-
+                OPTS = options.get_opts()
+                rotation_table = cc.get_expression_bone_rotations(self.avatar, OPTS.DATALINK_FOLDER, add_link_id=False)
                 expression_data = {}
-                bones = SC.GetSkinBones()
-                expressions = FC.GetExpressionNames("")
-                if expressions:
-                    for expression in expressions:
-                        is_face = False
-                        if expression in IGNORE_EXPRESSIONS:
-                            continue
-                        for face_prefix in FACIAL_EXPRESSION_PREFIXES:
-                            if expression.startswith(face_prefix):
-                                is_face = True
-                                break
-                        bone_data = {}
-                        bone: RINode
-                        for bone in bones:
-                            bone_name = bone.GetName()
-                            if is_face and bone_name not in FACE_BONES:
-                                continue
-                            try:
-                                ERM: RMatrix3 = FC.GetExpressionBoneRotation(bone_name, expression)
-                            except:
-                                ERM = RMatrix3(1, 0, 0,
-                                            0, 1, 0,
-                                            0, 0, 1)
-                            ERQ = RQuaternion()
-                            ERQ.FromRotationMatrix(ERM)
-                            euler_angle_x, euler_angle_y, euler_angle_z = cc.quaternion_to_euler_xyz(ERQ, degrees=True)
-                            t = abs(euler_angle_x) + abs(euler_angle_y) + abs(euler_angle_z)
-                            if t > 0.1:
-                                bone_data[bone_name] = {
-                                        "Rotation": cc.quaternion_to_array(ERQ),
-                                    }
-                        if bone_data:
-                            expression_data[expression] = { "Bones": bone_data }
+                for expression, bone_rotations in rotation_table.items():
+                    bone_data = {}
+                    for bone_name, rotation in bone_rotations.items():
+                        bone_data[bone_name] = {
+                                "Rotation": rotation,
+                            }
+                    if bone_data:
+                        expression_data[expression] = { "Bones": bone_data }
+                if FC.GetExpressionNames(""):
                     json_data.set_expression_set(expression_data)
 
             self.update_progress(0, "Exporting Additional Physics ...", True)
@@ -1169,7 +1162,8 @@ class Exporter:
             for child in child_objects:
                 if child not in objects:
                     objects.append(child)
-            skin_tree = cc.get_extended_skin_bones_tree(obj)
+            # the bone transforms change with the pose, so only the tree itself comes from the cache
+            skin_tree = cc.get_cached_skin_bones_tree(obj)[0]
             skin_bones, id_tree = cc.extract_extended_skin_bones(skin_tree, include_transforms=True)
             root_json["ID_Tree"] = id_tree
             root_json["Root Bones"] = cc.extract_root_bones_from_tree(skin_tree)
@@ -1232,20 +1226,15 @@ class Exporter:
 
         light: RILight = self.light
 
-        frame = 0
         link_id = cc.get_link_id(light)
-        light_index = -1
-        light_data = None
-        num_frames = len(self.all_camera_light_data)
-        for i, data in enumerate(self.all_camera_light_data[frame]["lights"]):
-            if data["link_id"] == link_id:
-                light_data = data
-                light_index = i
-
-        if not light_data:
+        num_frames = len(self.all_camera_light_data["times"])
+        timeline_light = self.all_camera_light_data["lights"].get(link_id)
+
+        if not timeline_light:
             utils.log_error(f"Unable to find light in light data: {light}")
             return False
 
+        light_data = timeline_light["data"]
         light_data["frame_count"] = num_frames
 
         utils.log_info(f"Exporting Light: {light.GetName()}")
@@ -1278,35 +1267,9 @@ class Exporter:
 
         utils.log_info(f"Packing Light Frames: {num_frames} ...")
 
-        frames_bytes = bytearray()
-        for frame_data in self.all_camera_light_data:
-            time = frame_data["time"]
-            frame = frame_data["frame"]
-            light_data = frame_data["lights"][light_index]
-            frame_bytes = struct.pack("!II?fffffffffffffffffff",
-                                     time,
-                                     frame,
-                                     light_data["active"],
-                                     light_data["loc"][0],
-                                     light_data["loc"][1],
-                                     light_data["loc"][2],
-                                     light_data["rot"][0],
-                                     light_data["rot"][1],
-                                     light_data["rot"][2],
-                                     light_data["rot"][3],
-                                     light_data["sca"][0],
-                                     light_data["sca"][1],
-                                     light_data["sca"][2],
-                                     light_data["color"][0],
-                                     light_data["color"][1],
-                                     light_data["color"][2],
-                                     light_data["multiplier"],
-                                     light_data["range"],
-                                     light_data["angle"],
-                                     light_data["falloff"],
-                                     light_data["attenuation"],
-                                     light_data["darkness"])
-            frames_bytes.extend(frame_bytes)
+        frames_bytes = pack_frame_columns(self.all_camera_light_data["times"],
+                                          self.all_camera_light_data["frames"],
+                                          timeline_light["columns"], cc.LIGHT_FRAME_COLUMNS)
         frames_header = struct.pack("!I", len(frames_bytes))
         binary_bytes.extend(frames_header)
         binary_bytes.extend(frames_bytes)
@@ -1325,20 +1288,15 @@ class Exporter:
         if not self.all_camera_light_data:
             self.all_camera_light_data = cc.get_all_camera_light_data(no_animation=cc.is_cc(), fps=self.option_fps)
 
-        frame = 0
         link_id = cc.get_link_id(self.camera)
-        camera_index = -1
-        camera_data = None
-        num_frames = len(self.all_camera_light_data)
-        for i, data in enumerate(self.all_camera_light_data[frame]["cameras"]):
-            if data["link_id"] == link_id:
-                camera_data = data
-                camera_index = i
-
-        if not camera_data:
+        num_frames = len(self.all_camera_light_data["times"])
+        timeline_camera = self.all_camera_light_data["cameras"].get(link_id)
+
+        if not timeline_camera:
             utils.log_error(f"Unable to find camera in camera data: {self.camera}")
             return False
 
+        camera_data = timeline_camera["data"]
         camera_data["frame_count"] = num_frames
 
         utils.log_info(f"Exporting Camera: {self.camera.GetName()}")
@@ -1355,36 +1313,9 @@ class Exporter:
 
         utils.log_info(f"Packing Camera Frames: {num_frames} ...")
 
-        frames_bytes = bytearray()
-        for frame_data in self.all_camera_light_data:
-            time = frame_data["time"]
-            frame = frame_data["frame"]
-            camera_data = frame_data["cameras"][camera_index]
-            frame_bytes = struct.pack("!IIfffffffffff?ffffffff?",
-                                     time,
-                                     frame,
-                                     camera_data["loc"][0],
-                                     camera_data["loc"][1],
-                                     camera_data["loc"][2],
-                                     camera_data["rot"][0],
-                                     camera_data["rot"][1],
-                                     camera_data["rot"][2],
-                                     camera_data["rot"][3],
-                                     camera_data["sca"][0],
-                                     camera_data["sca"][1],
-                                     camera_data["sca"][2],
-                                     camera_data["focal_length"],
-                                     camera_data["dof_enable"],
-                                     camera_data["dof_focus"], # Focus Distance
-                                     camera_data["dof_range"], # Perfect Focus Range
-                                     camera_data["dof_far_blur"],
-                                     camera_data["dof_near_blur"],
-                                     camera_data["dof_far_transition"],
-                                     camera_data["dof_near_transition"],
-                                     camera_data["dof_min_blend_distance"], # Blur Edge Sampling Scale
-                                     camera_data["fov"],
-                                     camera_data["active"])
-            frames_bytes.extend(frame_bytes)
+        frames_bytes = pack_frame_columns(self.all_camera_light_data["times"],
+                                          self.all_camera_light_data["frames"],
+                                          timeline_camera["columns"], cc.CAMERA_FRAME_COLUMNS)
         frames_header = struct.pack("!I", len(frames_bytes))
         binary_bytes.extend(frames_header)
         binary_bytes.extend(frames_bytes)
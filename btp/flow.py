@@ -0,0 +1,121 @@
+# Copyright (C) 2023 Victor Soupday
+# This file is part of CC/iC-Blender-Pipeline-Plugin <https://github.com/soupday/CCiC-Blender-Pipeline-Plugin>
+#
+# CC/iC-Blender-Pipeline-Plugin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC/iC-Blender-Pipeline-Plugin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC/iC-Blender-Pipeline-Plugin.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+
+MIN_WINDOW = 4
+MAX_WINDOW = 240
+START_WINDOW = 4
+MIN_QUEUE_DELAY_S = 1/60
+
+
+class SequenceWindow():
+    """Sliding window flow control for streaming sequence frames.
+
+       At most 'window' frames may be sent but not yet acknowledged. The window doubles each
+       round trip until frames first start queueing at the receiver (slow start), then grows by
+       one frame per round trip (additive increase) and is halved, at most once per round trip,
+       when the smoothed round trip rises above the base round trip by more than the base
+       round trip, or one loop interval, (multiplicative decrease)."""
+    window: float = START_WINDOW
+    min_window: float = MIN_WINDOW
+    max_window: float = MAX_WINDOW
+    sent_frame: int = -1
+    sent_times: dict = None
+    ack_frame: int = -1
+    ack_time: float = 0.0
+    ack_rate: float = 0.0
+    base_rtt: float = 0.0
+    srtt: float = 0.0
+    decrease_time: float = 0.0
+    slow_start: bool = True
+
+    def __init__(self, start_frame=0, window=START_WINDOW, min_window=MIN_WINDOW, max_window=MAX_WINDOW):
+        self.min_window = min_window
+        self.max_window = max_window
+        self.reset(start_frame, window)
+
+    def reset(self, start_frame=0, window=START_WINDOW):
+        self.window = max(self.min_window, min(self.max_window, window))
+        self.sent_frame = start_frame - 1
+        self.sent_times = {}
+        self.ack_frame = start_frame - 1
+        self.ack_time = 0.0
+        self.ack_rate = 0.0
+        self.base_rtt = 0.0
+        self.srtt = 0.0
+        self.decrease_time = 0.0
+        self.slow_start = True
+
+    def in_flight(self):
+        return self.sent_frame - self.ack_frame
+
+    def available(self):
+        return max(0, int(self.window) - self.in_flight())
+
+    def can_send(self):
+        return self.available() > 0
+
+    def on_send(self, frame, t=None):
+        if t is None:
+            t = time.time()
+        self.sent_frame = max(self.sent_frame, frame)
+        self.sent_times[frame] = t
+
+    def on_ack(self, frame, t=None):
+        """Processes a cumulative ack: all frames up to and including frame have been received"""
+        if t is None:
+            t = time.time()
+        if frame <= self.ack_frame:
+            return
+        acked = frame - self.ack_frame
+
+        # round trip of the acknowledged frame, discarding older send times
+        sent_time = self.sent_times.pop(frame, None)
+        for f in [ f for f in self.sent_times if f < frame ]:
+            self.sent_times.pop(f)
+        if sent_time is not None:
+            rtt = max(0.0, t - sent_time)
+            if self.srtt == 0.0:
+                self.srtt = rtt
+                self.base_rtt = rtt
+            else:
+                self.srtt = 0.875 * self.srtt + 0.125 * rtt
+                self.base_rtt = min(self.base_rtt, rtt)
+
+        # acknowledged frames per second
+        if self.ack_time > 0.0:
+            delta_time = max(t - self.ack_time, 1/1000)
+            self.ack_rate = 0.75 * self.ack_rate + 0.25 * (acked / delta_time)
+        self.ack_frame = frame
+        self.ack_time = t
+
+        # AIMD
+        queue_delay = self.srtt - self.base_rtt
+        if queue_delay > max(self.base_rtt, MIN_QUEUE_DELAY_S):
+            if t - self.decrease_time > self.srtt:
+                self.window = max(self.min_window, self.window * 0.5)
+                self.decrease_time = t
+                self.slow_start = False
+        elif self.slow_start:
+            self.window = min(self.max_window, self.window + acked)
+        else:
+            self.window = min(self.max_window, self.window + acked / self.window)
+
+    def batch_size(self, max_frames):
+        """Half the frames acknowledged over a round trip, so there is always another batch in flight"""
+        size = int(self.srtt * self.ack_rate / 2)
+        return max(1, min(max_frames, size))
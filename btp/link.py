@@ -20,8 +20,9 @@ from PySide2.QtWidgets import *
 from PySide2.QtCore import *
 from PySide2.QtGui import *
 from shiboken2 import wrapInstance
-import os, socket, select, struct, time, json, atexit, traceback, shutil
-from . import vars, utils, cc, qt, options, prefs, tests, importer, exporter, morph, gob
+import os, socket, select, struct, time, json, atexit, traceback, shutil, hashlib
+from collections import deque
+from . import vars, utils, cc, qt, options, prefs, tests, importer, exporter, morph, gob, flow, bake, kinematics, simplify
 from . utils import LI, LW, LD, log_info, log_detail, log_warn, log_error
 from . error import ErrorCode, error_report, error_reset, error_show
 from enum import IntEnum
@@ -41,6 +42,24 @@ USE_KEEPALIVE = False
 SOCKET_TIMEOUT = 5.0
 INCLUDE_POSE_MESHES = False
 PROP_FIX = False
+LINK_FEATURES = ["batch_frames", "sparse_channels", "channel_subsets", "template_hash"]
+MAX_BATCH_FRAMES = 30
+SPARSE_FLAG = 0x80000000
+SUBSET_FLAG = 0x80000000
+MAX_SEND_COUNT = 8
+# number of received actor templates kept by hash
+RECEIVED_TEMPLATES_SIZE = 64
+# received expression weights within this of the last keyed weight are not keyed again
+EXPRESSION_KEY_TOLERANCE = 0.001
+# time slice per loop for applying buffered received sequence frames
+SEQUENCE_APPLY_BUDGET_S = 1/120
+# convert the keyed bone rotations with kinematics.quats_to_euler_xyz instead of RLPy's ToEulerAngle,
+# off until tests.euler_golden_test has been run against RLPy in CC/iC
+FAST_EULER = False
+POSE_LIGHT_FORMAT = "!?fffffffff"
+POSE_CAMERA_FORMAT = "!f?fffffff"
+RECEIVE_LIGHT_FORMAT = "!?fffffff"
+RECEIVE_CAMERA_FORMAT = "!f?ff"
 
 class OpCodes(IntEnum):
     NONE = 0
@@ -102,24 +121,6 @@ VISEME_NAME_MAP = {
     "R": EVisemeID_R,
 }
 
-FACIAL_EXPRESSION_PREFIXES = [
-    "Mouth_",
-    "Jaw_",
-    "Eye_",
-    "Right_Eyeball_",
-    "Left_Eyeball_",
-    "A25_Jaw_",
-    "Move_Jaw_",
-    "Turn_Jaw_",
-]
-
-IGNORE_EXPRESSIONS = [ "Mouth_Close" ]
-
-FACE_BONES = [ "CC_Base_JawRoot", "CC_Base_FacialBone", "CC_Base_Head",
-               "CC_Base_Tongue01", "CC_Base_Tongue02", "CC_Base_Tongue03",
-               "CC_Base_R_Eye", "CC_Base_L_Eye",
-               "CC_Base_Teeth01", "CC_Base_Teeth02", "CC_Base_UpperJaw" ]
-
 FACE_DRIVERS = {
     # Std / Ext
     "Jaw_Open": "CC_Base_JawRoot",
@@ -145,29 +146,77 @@ FACE_DRIVERS = {
 
 
 class LinkActor():
-    name: str = "Name"
-    object: RIObject = None
-    bones: list = None
-    shapes: list = None
-    id_tree: dict = None
-    skin_bones: list = None
-    skin_tree: dict = None
-    skin_objects: dict = None
-    skin_meshes: list = None
-    expressions: dict = None
-    expression_rotations: dict = None
-    face_rotations: dict = None
-    face_drivers: dict = None
-    use_drivers: bool = False
-    visemes: dict = None
-    morphs: dict = None
-    t_pose: dict = None
-    alias: list = None
+    """The link state of a scene object. The object type, its components and its expression
+       and viseme names are resolved once, call invalidate() if the object itself changes."""
+    __slots__ = ("name", "object", "actor_type", "components", "expression_names", "viseme_names",
+                 "bones", "bone_ids", "shapes", "id_tree", "skin_bones", "skin_tree", "skin_objects", "skin_meshes",
+                 "expressions", "expression_rotations", "counter_rotations", "face_rotations", "face_drivers",
+                 "use_drivers", "visemes", "morphs", "morph_ids",
+                 "bone_subset", "subset_bones", "channel_subsets", "subset_expression_names",
+                 "t_pose", "retarget_plan", "retarget_kernel",
+                 "expression_key_names", "expression_key_indices", "expression_key_values",
+                 "expression_key_held", "expression_key_time", "key_recorder", "alias", "static_data", "revision")
+    name: str
+    object: RIObject
+    actor_type: str
+    components: dict
+    expression_names: list
+    viseme_names: list
+    bones: list
+    bone_ids: list
+    shapes: list
+    id_tree: dict
+    skin_bones: list
+    skin_tree: dict
+    skin_objects: dict
+    skin_meshes: list
+    expressions: dict
+    expression_rotations: dict
+    counter_rotations: dict
+    face_rotations: dict
+    face_drivers: dict
+    use_drivers: bool
+    visemes: dict
+    morphs: dict
+    morph_ids: list
+    bone_subset: list
+    subset_bones: list
+    channel_subsets: dict
+    subset_expression_names: list
+    t_pose: dict
+    retarget_plan: list
+    retarget_kernel: kinematics.FKKernel
+    expression_key_names: list
+    expression_key_indices: list
+    expression_key_values: list
+    expression_key_held: list
+    expression_key_time: RTime
+    key_recorder: simplify.KeyRecorder
+    alias: list
+    static_data: dict
+    # scene revision the type, components and channel names were resolved in
+    revision: str
 
     def __init__(self, object):
         self.name = object.GetName()
         self.object = object
+        self.invalidate()
+        self.reset()
+        self.get_link_id()
+
+    def invalidate(self):
+        """Drops the resolved object type, components and channel names"""
+        self.actor_type = None
+        self.components = {}
+        self.expression_names = None
+        self.viseme_names = None
+        self.revision = cc.get_scene_revision()
+
+    def reset(self):
+        """Clears the state of any previous link operation"""
+        self.static_data = None
         self.bones = []
+        self.bone_ids = []
         self.id_tree = {}
         self.shapes = []
         self.skin_tree = {}
@@ -176,14 +225,23 @@ class LinkActor():
         self.skin_meshes = []
         self.expressions = {}
         self.expression_rotations = {}
+        self.counter_rotations = {}
         self.face_rotations = {}
         self.face_drivers = {}
-        self.drivers = False
+        self.use_drivers = False
         self.visemes = {}
         self.morphs = {}
+        self.morph_ids = []
+        self.bone_subset = None
+        self.subset_bones = None
+        self.channel_subsets = {}
+        self.subset_expression_names = None
         self.t_pose = None
+        self.retarget_plan = None
+        self.retarget_kernel = None
+        self.reset_expression_keys()
+        self.key_recorder = None
         self.alias = []
-        self.get_link_id()
 
     def get_avatar(self) -> RIAvatar:
         return self.object
@@ -216,93 +274,105 @@ class LinkActor():
         if FC:
             FC.BeginKeyEditing()
 
-    def end_editing(self, time):
+    def end_editing(self, time, bake_skin_objects=False):
+        """Ends the expression key editing and bakes the FK keys to IK over the whole clip.
+           bake_skin_objects: also bake the attached skinned props and accessories,
+           when their IK was not baked per frame."""
         FC = self.get_face_component()
         if FC:
             FC.EndKeyEditing()
         SC = self.get_skeleton_component()
         if SC:
             SC.BakeFkToIk(time, True)
+        if bake_skin_objects:
+            for obj_id, skin_def in self.skin_objects.items():
+                skin_SC: RISkeletonComponent = skin_def["SC"]
+                if skin_def["object"] and skin_SC and skin_def["clip"] and obj_id != self.object.GetID():
+                    skin_SC.BakeFkToIk(time, True)
+
+    def get_component(self, key, resolve):
+        if key not in self.components:
+            self.components[key] = resolve() if self.object else None
+        return self.components[key]
 
     def get_skeleton_component(self) -> RISkeletonComponent:
-        if self.object:
-            return cc.safe_get_skeleton_component(self.object)
-        return None
+        return self.get_component("SC", lambda: cc.safe_get_skeleton_component(self.object))
 
     def get_face_component(self) -> RIFaceComponent:
-        if self.object:
-            if cc.is_avatar(self.object):
-                return self.object.GetFaceComponent()
-        return None
+        return self.get_component("FC", lambda: self.object.GetFaceComponent() if cc.is_avatar(self.object) else None)
 
     def get_viseme_component(self) -> RIVisemeComponent:
-        if self.object:
-            if cc.is_avatar(self.object):
-                return self.object.GetVisemeComponent()
-        return None
+        return self.get_component("VC", lambda: self.object.GetVisemeComponent() if cc.is_avatar(self.object) else None)
 
     def get_morph_component(self) -> RIMorphComponent:
-        if self.object:
-            if cc.is_avatar(self.object) or cc.is_prop(self.object):
-                return self.object.GetMorphComponent()
-        return None
+        return self.get_component("MC", lambda: self.object.GetMorphComponent()
+                                                if cc.is_avatar(self.object) or cc.is_prop(self.object) else None)
+
+    def get_shaping_component(self) -> RIAvatarShapingComponent:
+        return self.get_component("ASC", lambda: self.object.GetAvatarShapingComponent() if cc.is_avatar(self.object) else None)
+
+    def get_expression_names(self) -> list:
+        if self.expression_names is None:
+            FC = self.get_face_component()
+            self.expression_names = list(FC.GetExpressionNames("")) if FC else []
+        return self.expression_names
+
+    def get_viseme_names(self) -> list:
+        if self.viseme_names is None:
+            VC = self.get_viseme_component()
+            self.viseme_names = list(VC.GetVisemeNames()) if VC else []
+        return self.viseme_names
 
     def get_expression_bone_rotations(self, actor_expressions):
-        FC = self.get_face_component()
-        SC = self.get_skeleton_component()
-        bones = SC.GetSkinBones()
-        expressions = FC.GetExpressionNames("")
+        rotation_table = cc.get_expression_bone_rotations(self.object, options.get_opts().DATALINK_FOLDER)
         expression_rotations = {}
         face_rotations = {}
         face_drivers = {}
         if vars.DEV:
             if LI(): log_info("Expression Bones:")
 
-        for expression in expressions:
-            is_face = False
-            if expression in IGNORE_EXPRESSIONS:
+        for expression, bone_rotations in rotation_table.items():
+            if expression not in actor_expressions:
                 continue
-            for face_prefix in FACIAL_EXPRESSION_PREFIXES:
-                if expression.startswith(face_prefix):
-                    is_face = True
-                    break
-            for bone in bones:
-                bone_name = bone.GetName()
+            is_face = cc.is_face_expression(expression)
+            for bone_name, rotation in bone_rotations.items():
                 is_face_driver = False
-                if is_face and bone_name not in FACE_BONES:
-                    continue
-                try:
-                    ERM: RMatrix3 = FC.GetExpressionBoneRotation(bone_name, expression)
-                except:
-                    ERM = RMatrix3(1, 0, 0,
-                                   0, 1, 0,
-                                   0, 0, 1)
-                ERQ = RQuaternion()
-                ERQ.FromRotationMatrix(ERM)
-                euler_angle_x, euler_angle_y, euler_angle_z = cc.quaternion_to_euler_xyz(ERQ, degrees=True)
-                t = abs(euler_angle_x) + abs(euler_angle_y) + abs(euler_angle_z)
-                if t > 0.1:
-                    if expression in actor_expressions:
-                        if is_face:
-                            if expression not in face_rotations:
-                                face_rotations[expression] = {}
-                            face_rotations[expression][bone_name] = ERQ
-                            if expression in FACE_DRIVERS:
-                                driving_bone = FACE_DRIVERS[expression]
-                                if bone_name == driving_bone:
-                                    if driving_bone not in face_drivers:
-                                        face_drivers[driving_bone] = []
-                                    face_drivers[driving_bone].append(expression)
-                                    is_face_driver = True
-                        else:
-                            if expression not in expression_rotations:
-                                expression_rotations[expression] = {}
-                            expression_rotations[expression][bone_name] = ERQ
-                        if vars.DEV:
-                            if LI(): log_info(f" - {expression} / {bone_name} = ({euler_angle_x:.4f}, {euler_angle_y:.4f}, {euler_angle_z:.4f}){' FACE DRIVER' if is_face_driver else ''}")
+                ERQ = cc.array_to_quaternion(rotation)
+                if is_face:
+                    if expression not in face_rotations:
+                        face_rotations[expression] = {}
+                    face_rotations[expression][bone_name] = ERQ
+                    if expression in FACE_DRIVERS:
+                        driving_bone = FACE_DRIVERS[expression]
+                        if bone_name == driving_bone:
+                            if driving_bone not in face_drivers:
+                                face_drivers[driving_bone] = []
+                            face_drivers[driving_bone].append(expression)
+                            is_face_driver = True
+                else:
+                    if expression not in expression_rotations:
+                        expression_rotations[expression] = {}
+                    expression_rotations[expression][bone_name] = ERQ
+                if vars.DEV:
+                    euler_angle_x, euler_angle_y, euler_angle_z = cc.quaternion_to_euler_xyz(ERQ, degrees=True)
+                    if LI(): log_info(f" - {expression} / {bone_name} = ({euler_angle_x:.4f}, {euler_angle_y:.4f}, {euler_angle_z:.4f}){' FACE DRIVER' if is_face_driver else ''}")
         self.expression_rotations = expression_rotations
         self.face_rotations = face_rotations
         self.face_drivers = face_drivers
+        self.update_counter_rotations()
+
+    def update_counter_rotations(self):
+        """Sparse table of the expression rotations affecting each bone:
+           { bone_name: [ (shape index, ERQ), ... ] }, in expression order,
+           bones not rotated by any expression are left out"""
+        counter_rotations = {}
+        for exp_name, bone_rotations in self.expression_rotations.items():
+            exp_index = self.expressions[exp_name]
+            for bone_name, ERQ in bone_rotations.items():
+                if bone_name not in counter_rotations:
+                    counter_rotations[bone_name] = []
+                counter_rotations[bone_name].append((exp_index, ERQ))
+        self.counter_rotations = counter_rotations
 
     def set_template(self, actor_data: dict):
         self.bones = actor_data.get("bones")
@@ -319,7 +389,7 @@ class LinkActor():
         self.visemes = {}
         self.morphs = {}
         if FC:
-            names = FC.GetExpressionNames("")
+            names = self.get_expression_names()
             for i, name in enumerate(self.shapes):
                 if name in names:
                     self.expressions[name] = i
@@ -331,9 +401,87 @@ class LinkActor():
                     self.visemes[viseme_id] = i
         if MC:
             pass
+        self.reset_expression_keys()
+        self.update_retarget_plan()
+
+    def set_subsets(self, subset_data: dict):
+        """Sets the subsets of bone and channel indices the receiver actually uses,
+           a missing or null subset means all of them"""
+        bones = subset_data.get("bones")
+        if bones is not None:
+            self.bone_subset = [ i for i in bones if 0 <= i < len(self.skin_bones) ]
+            self.subset_bones = [ self.skin_bones[i] for i in self.bone_subset ]
+        else:
+            self.bone_subset = None
+            self.subset_bones = None
+        expression_names = self.get_expression_names()
+        counts = {
+            "expressions": len(expression_names),
+            "visemes": len(self.get_viseme_names()),
+            "morphs": len(self.morph_ids),
+        }
+        self.channel_subsets = {}
+        for key, count in counts.items():
+            indices = subset_data.get(key)
+            if indices is not None:
+                self.channel_subsets[key] = [ i for i in indices if 0 <= i < count ]
+        self.subset_expression_names = None
+        if "expressions" in self.channel_subsets:
+            self.subset_expression_names = [ expression_names[i] for i in self.channel_subsets["expressions"] ]
 
     def set_t_pose(self, t_pose):
         self.t_pose = t_pose
+        self.update_retarget_plan()
+
+    def update_retarget_plan(self):
+        """(Re)builds the retarget plan once both the t-pose and the template are known"""
+        self.retarget_plan = None
+        self.retarget_kernel = None
+        if self.t_pose and self.bone_ids and self.skin_tree:
+            self.retarget_plan = build_retarget_plan(self)
+            self.retarget_kernel = kinematics.FKKernel([ step["parent"] for step in self.retarget_plan ],
+                                                       [ step["pose_index"] for step in self.retarget_plan ],
+                                                       [ step["t_pose"] for step in self.retarget_plan ])
+
+    def reset_expression_keys(self):
+        self.expression_key_names = None
+        self.expression_key_indices = None
+        self.expression_key_values = None
+        self.expression_key_held = None
+        self.expression_key_time = None
+
+    def get_changed_expression_keys(self, time: RTime, shape_data):
+        """Returns the expression keys to add at time, for only the expressions whose weight
+           changed from the last keyed weight, and the hold keys needed at the previous frame
+           time for those that were held unkeyed since, so they don't interpolate across the gap:
+           (hold_time, hold_names, hold_strengths, names, strengths)"""
+        if self.expression_key_names is None:
+            self.expression_key_names = list(self.expressions.keys())
+            self.expression_key_indices = list(self.expressions.values())
+            self.expression_key_values = [ None ] * len(self.expression_key_names)
+            self.expression_key_held = [ False ] * len(self.expression_key_names)
+        hold_names = []
+        hold_strengths = []
+        names = []
+        strengths = []
+        values = self.expression_key_values
+        held = self.expression_key_held
+        for i, name in enumerate(self.expression_key_names):
+            weight = shape_data[self.expression_key_indices[i]]
+            last = values[i]
+            if last is None or abs(weight - last) > EXPRESSION_KEY_TOLERANCE:
+                if held[i]:
+                    hold_names.append(name)
+                    hold_strengths.append(last)
+                names.append(name)
+                strengths.append(weight)
+                values[i] = weight
+                held[i] = False
+            else:
+                held[i] = True
+        hold_time = self.expression_key_time
+        self.expression_key_time = time
+        return hold_time, hold_names, hold_strengths, names, strengths
 
     def add_alias(self, link_id):
         actor_link_id = cc.get_link_id(self.object)
@@ -347,11 +495,11 @@ class LinkActor():
             return
 
     @staticmethod
-    def find_actor(link_id, search_name=None, search_type=None):
+    def find_actor(link_id, search_name=None, search_type=None, scene_index: cc.SceneIndex=None):
 
         if LD: log_detail(f"Looking for LinkActor: {search_name} {link_id} {search_type}")
         actor: LinkActor = None
-        obj = cc.find_object_by_link_id(link_id)
+        obj = cc.find_object_by_link_id(link_id, scene_index=scene_index)
         if obj:
             if not search_type or LinkActor.get_actor_type(obj) == search_type or search_type == "MESH":
                 actor = LinkActor(obj)
@@ -360,7 +508,7 @@ class LinkActor():
         if LD: log_detail(f"Chr not found by link_id")
 
         if search_name:
-            obj = cc.find_object_by_name_and_type(search_name, search_type)
+            obj = cc.find_object_by_name_and_type(search_name, search_type, scene_index=scene_index)
             if obj:
                 found_link_id = cc.get_link_id(obj)
                 if LD: log_detail(f"Chr found by name: {obj.GetName()} / {found_link_id}")
@@ -386,7 +534,18 @@ class LinkActor():
         return cc.get_object_type(obj)
 
     def get_type(self):
-        return self.get_actor_type(self.object)
+        if self.actor_type is None:
+            self.actor_type = self.get_actor_type(self.object)
+        return self.actor_type
+
+    def get_static_data(self):
+        """The light or camera properties that don't change over a shot"""
+        if self.static_data is None:
+            if self.is_light():
+                self.static_data = cc.get_light_static_data(self.object)
+            elif self.is_camera():
+                self.static_data = cc.get_camera_static_data(self.object)
+        return self.static_data
 
     def is_avatar(self):
         return cc.is_avatar(self.object)
@@ -414,6 +573,17 @@ class LinkActor():
         cc.set_link_id(self.object, link_id)
 
 
+def reset_actors(actors):
+    """Clears the state of the previous link operation from the (cached) actors,
+       and their resolved components and channel names if the scene data has changed since"""
+    revision = cc.get_scene_revision()
+    actor: LinkActor
+    for actor in actors:
+        if actor.revision != revision:
+            actor.invalidate()
+        actor.reset()
+
+
 class LinkData():
     link_host: str = "localhost"
     link_host_ip: str = "127.0.0.1"
@@ -429,14 +599,45 @@ class LinkData():
     sequence_actors: list = None
     sequence_active: bool = False
     sequence_type: str = None
-    #
-    ack_rate: float = 0.0
-    ack_time: float = 0.0
+    sequence_batched: bool = False
+    sequence_sparse: bool = False
+    sequence_window: flow.SequenceWindow = None
+    # { last frame of a sent batch: number of frames in the batch }, checked against its ack
+    sequence_batch_sizes: dict = None
+    sequence_bake: bake.SequenceBake = None
+    sequence_baked: bool = False
+    sequence_defer_bake: bool = False
+    sequence_frame_buffer: deque = None
+    sequence_buffer_size: int = 0
+    sequence_apply_loop: int = -1
+    sequence_recorder: simplify.KeyRecorder = None
+    sequence_simplify: simplify.SequenceSimplify = None
+    sequence_end_args: tuple = None
+    camera_switches: tuple = None
+    # { object id: LinkActor } of the selected actors, for the current structure revision
+    actor_cache: dict = None
+    actor_cache_revision: str = None
+    # last sent templates { link_id: actor template } and the hashes the remote has confirmed it knows,
+    # kept across reconnects to the same remote
+    sent_templates: dict = None
+    remote_template_hashes: set = None
+    remote_template_identity: tuple = None
+    # received templates by content hash { hash: actor template }, the most recent last
+    received_templates: dict = None
+    # { link_id: LinkActor } sequence actors waiting for the full template of a hash unknown here
+    template_pending: dict = None
+    # [ (receive func, data) ] pose and sequence frames held back until the pending templates arrive
+    template_pending_frames: list = None
     #
     stored_selection: list = None
 
     def __init__(self):
-        return
+        self.actor_cache = {}
+        self.sent_templates = {}
+        self.remote_template_hashes = set()
+        self.received_templates = {}
+        self.template_pending = {}
+        self.template_pending_frames = []
 
     def find_sequence_actor(self, link_id) -> LinkActor:
         if self.sequence_actors:
@@ -476,6 +677,167 @@ def decode_to_json(data) -> dict:
     return json_data
 
 
+SAMPLE_CHANNELS = ["expressions", "visemes", "morphs"]
+SAMPLE_FIELDS = ["light", "camera"]
+# { actor type: (sample field, number of values) }, see DataLink.sample_actor_frame
+SAMPLE_TYPE_FIELDS = {
+    "LIGHT": ("light", 10),
+    "CAMERA": ("camera", 9),
+}
+
+
+def pack_weights(weights, sparse=False, subset=None):
+    """Packs a block of channel weights as [count][count x weight] or, if sparse and smaller,
+       as [count | SPARSE_FLAG][n][n x (index, weight)] of only the non-zero weights.
+       With a subset, only the weights of the subset indices are packed, always as pairs."""
+    count = len(weights)
+    if subset is not None:
+        pairs = [ (i, weights[i]) for i in subset if not sparse or weights[i] != 0.0 ]
+        data = bytearray(struct.pack("!II", count | SPARSE_FLAG, len(pairs)))
+        for i, w in pairs:
+            data += struct.pack("!If", i, w)
+        return data
+    if sparse:
+        non_zero = [ (i, w) for i, w in enumerate(weights) if w != 0.0 ]
+        if len(non_zero) * 2 < count:
+            data = bytearray(struct.pack("!II", count | SPARSE_FLAG, len(non_zero)))
+            for i, w in non_zero:
+                data += struct.pack("!If", i, w)
+            return data
+    return struct.pack(f"!I{count}f", count, *weights)
+
+
+def unpack_weights(buffer, offset=0):
+    count = struct.unpack_from("!I", buffer, offset)[0]
+    offset += 4
+    if count & SPARSE_FLAG:
+        count &= ~SPARSE_FLAG
+        weights = [0.0] * count
+        n = struct.unpack_from("!I", buffer, offset)[0]
+        offset += 4
+        for j in range(0, n):
+            i, w = struct.unpack_from("!If", buffer, offset)
+            offset += 8
+            weights[i] = w
+    else:
+        weights = list(struct.unpack_from(f"!{count}f", buffer, offset))
+        offset += count * 4
+    return offset, weights
+
+
+def pack_weight_columns(columns, num_frames, sparse=False, subset=None):
+    """Packs a block of channel weight columns (one weight per frame per channel) as
+       [count][count x num_frames weights] or, if sparse and smaller, as
+       [count | SPARSE_FLAG][n][n x (index, num_frames weights)] of only the non-zero columns.
+       With a subset, only the columns of the subset indices are packed, always as pairs."""
+    count = len(columns)
+    if subset is not None:
+        pairs = [ (i, columns[i]) for i in subset if not sparse or any(columns[i]) ]
+        data = bytearray(struct.pack("!II", count | SPARSE_FLAG, len(pairs)))
+        for i, column in pairs:
+            data += struct.pack(f"!I{num_frames}f", i, *column)
+        return data
+    if sparse:
+        non_zero = [ (i, column) for i, column in enumerate(columns) if any(column) ]
+        if len(non_zero) * (num_frames + 1) < count * num_frames:
+            data = bytearray(struct.pack("!II", count | SPARSE_FLAG, len(non_zero)))
+            for i, column in non_zero:
+                data += struct.pack(f"!I{num_frames}f", i, *column)
+            return data
+    data = bytearray(struct.pack("!I", count))
+    for column in columns:
+        data += struct.pack(f"!{num_frames}f", *column)
+    return data
+
+
+def unpack_weight_columns(buffer, offset, num_frames):
+    count = struct.unpack_from("!I", buffer, offset)[0]
+    offset += 4
+    if count & SPARSE_FLAG:
+        count &= ~SPARSE_FLAG
+        columns = [ None ] * count
+        n = struct.unpack_from("!I", buffer, offset)[0]
+        offset += 4
+        for j in range(0, n):
+            i = struct.unpack_from("!I", buffer, offset)[0]
+            offset += 4
+            columns[i] = struct.unpack_from(f"!{num_frames}f", buffer, offset)
+            offset += num_frames * 4
+        zeros = (0.0,) * num_frames
+        columns = [ column if column else zeros for column in columns ]
+    else:
+        columns = []
+        for i in range(0, count):
+            columns.append(struct.unpack_from(f"!{num_frames}f", buffer, offset))
+            offset += num_frames * 4
+    return offset, columns
+
+
+def get_frame_samples_layout(samples):
+    """The per actor sizes of a frame of actor samples (see DataLink.sample_actor_frame),
+       the bone and channel counts are fixed for the whole sequence"""
+    layout = []
+    for sample in samples:
+        actor_layout = { "type": sample["type"] }
+        if "bones" in sample:
+            actor_layout["bones"] = len(sample["bones"])
+        for key in SAMPLE_CHANNELS:
+            if key in sample:
+                actor_layout[key] = len(sample[key])
+        # light and camera data slots come from the actor type, they may be missing on any frame
+        if sample["type"] in SAMPLE_TYPE_FIELDS:
+            key, size = SAMPLE_TYPE_FIELDS[sample["type"]]
+            actor_layout[key] = size
+        layout.append(actor_layout)
+    return layout
+
+
+def get_frame_samples_size(layout):
+    size = 0
+    for actor_layout in layout:
+        size += 10 + actor_layout.get("bones", 0) * 10
+        for key in SAMPLE_CHANNELS + SAMPLE_FIELDS:
+            size += actor_layout.get(key, 0)
+    return size
+
+
+def flatten_frame_samples(samples, layout):
+    row = []
+    for sample, actor_layout in zip(samples, layout):
+        row.extend(sample["transform"])
+        for bone in sample.get("bones", []):
+            row.extend(bone)
+        for key in SAMPLE_CHANNELS:
+            if key in actor_layout:
+                row.extend(sample[key])
+        for key in SAMPLE_FIELDS:
+            if key in actor_layout:
+                # a missing field is stored as NaN, so it stays missing when read back
+                row.extend(sample.get(key) or [math.nan] * actor_layout[key])
+    return row
+
+
+def unflatten_frame_samples(row, layout):
+    samples = []
+    i = 0
+    for actor_layout in layout:
+        sample = { "type": actor_layout["type"] }
+        sample["transform"] = row[i:i+10]
+        i += 10
+        if "bones" in actor_layout:
+            num_bones = actor_layout["bones"]
+            sample["bones"] = [ row[i+b*10:i+b*10+10] for b in range(0, num_bones) ]
+            i += num_bones * 10
+        for key in SAMPLE_CHANNELS + SAMPLE_FIELDS:
+            if key in actor_layout:
+                n = actor_layout[key]
+                if not (key in SAMPLE_FIELDS and math.isnan(row[i])):
+                    sample[key] = row[i:i+n]
+                i += n
+        samples.append(sample)
+    return samples
+
+
 def reset_animation():
     start_time = RGlobal.GetStartTime()
     RGlobal.SetTime(start_time)
@@ -631,7 +993,9 @@ def finalize_avatar_clip(avatar, clip):
         SC.BakeFkToIk(RTime.FromValue(0), True)
 
 
-def apply_pose(actor: LinkActor, time: RTime, pose_data, shape_data):
+def apply_pose(actor: LinkActor, time: RTime, pose_data, shape_data, bake_ik=True):
+    """Keys the FK pose of the actor at time, and bakes it to IK unless bake_ik is False,
+       i.e. when the whole sequence is baked once at the end"""
     for obj_id, skin_def in actor.skin_objects.items():
         obj = skin_def["object"]
         SC = skin_def["SC"]
@@ -640,19 +1004,25 @@ def apply_pose(actor: LinkActor, time: RTime, pose_data, shape_data):
             clip_time = clip.SceneTimeToClipTime(time)
             skin_def["clip_time"] = clip_time
 
-    root_rot = RQuaternion(RVector4(0,0,0,1))
-    root_tra = RVector3(0,0,0)
-    root_sca = RVector3(1,1,1)
-    apply_world_fk_pose(actor, actor.skin_tree,
-                        pose_data, shape_data,
-                        root_rot, root_tra, root_sca)
-
-    for obj_id, skin_def in actor.skin_objects.items():
-        obj = skin_def["object"]
-        SC: RISkeletonComponent = skin_def["SC"]
-        clip = skin_def["clip"]
-        if obj and SC and clip:
-            SC.BakeFkToIk(time, False)
+    if actor.retarget_plan is None:
+        actor.update_retarget_plan()
+    if actor.retarget_plan is not None:
+        apply_retarget_plan(actor, actor.retarget_plan, pose_data, shape_data)
+    else:
+        root_rot = RQuaternion(RVector4(0,0,0,1))
+        root_tra = RVector3(0,0,0)
+        root_sca = RVector3(1,1,1)
+        apply_world_fk_pose(actor, actor.skin_tree,
+                            pose_data, shape_data,
+                            root_rot, root_tra, root_sca)
+
+    if bake_ik:
+        for obj_id, skin_def in actor.skin_objects.items():
+            obj = skin_def["object"]
+            SC: RISkeletonComponent = skin_def["SC"]
+            clip = skin_def["clip"]
+            if obj and SC and clip:
+                SC.BakeFkToIk(time, False)
 
 
 def get_pose_local(actor: LinkActor):
@@ -671,6 +1041,17 @@ def get_pose_local(actor: LinkActor):
     return pose
 
 
+def get_template_hash(actor_template: dict):
+    template_string = json.dumps(actor_template, sort_keys=True)
+    return hashlib.md5(template_string.encode("utf-8")).hexdigest()
+
+
+def get_skeleton_signature(skin_bones: list):
+    bone: RINode
+    ids = "|".join(f"{bone.GetID()}:{bone.GetName()}" for bone in skin_bones)
+    return hashlib.md5(ids.encode("utf-8")).hexdigest()
+
+
 def get_pose_world(avatar: RIAvatar):
     pose = {}
     SC = cc.safe_get_skeleton_component(avatar)
@@ -709,22 +1090,22 @@ def log_transform(name, rot, tra, sca):
 
 
 def get_expression_counter_rotation(actor: LinkActor, bone_name, expression_weights) -> RQuaternion:
-    """TODO optimize this:
-         store expression_rotation keys as indices not names
-         only need to figure out once which bones are affected and pass that list along"""
-    exp_rotations = actor.expression_rotations
-    R = RQuaternion(RVector4(0,0,0,1))
+    return calc_counter_rotation(actor.counter_rotations.get(bone_name), expression_weights)
+
+
+def calc_counter_rotation(counter_rotations: list, expression_weights) -> RQuaternion:
+    """Inverse of the combined weighted expression rotations on a bone,
+       or None if the bone is not rotated by any active expression"""
+    if not counter_rotations:
+        return None
+    R = None
     I = RQuaternion(RVector4(0,0,0,1))
-    if True:
-        for exp_name in exp_rotations:
-            exp_index = actor.expressions[exp_name]
-            w = expression_weights[exp_index]
-            if w > 0.001:
-                if bone_name in exp_rotations[exp_name]:
-                    ERQ: RQuaternion = exp_rotations[exp_name][bone_name]
-                    ERQW = I + (ERQ - I)*w
-                    R = R.Multiply(ERQW)
-    return R.Inverse()
+    for exp_index, ERQ in counter_rotations:
+        w = expression_weights[exp_index]
+        if w > 0.001:
+            ERQW = I + (ERQ - I)*w
+            R = ERQW if R is None else R.Multiply(ERQW)
+    return R.Inverse() if R is not None else None
 
 
 def apply_world_ik_pose(actor, SC: RISkeletonComponent, clip: RIClip, time: RTime, pose_data):
@@ -770,7 +1151,8 @@ def apply_world_fk_pose(actor: LinkActor, skin_tree_def: dict,
         if SC and clip:
             set_bone_control(SC, clip, skin_bone, time, ec_rot,
                              t_pose_rot, t_pose_tra, t_pose_sca,
-                             local_rot, local_tra, local_sca)
+                             local_rot, local_tra, local_sca,
+                             controls=get_skin_def_controls(obj_def, bone_id))
 
         for child_def in skin_tree_def["children"]:
             apply_world_fk_pose(actor, child_def,
@@ -792,6 +1174,104 @@ def apply_world_fk_pose(actor: LinkActor, skin_tree_def: dict,
                                 world_rot, world_tra, world_sca)
 
 
+def get_skin_def_controls(skin_def: dict, bone_id):
+    controls = skin_def.get("controls")
+    return controls.get(bone_id) if controls else None
+
+
+def build_retarget_plan(actor: LinkActor):
+    """Flattens the skin bone tree into the order apply_world_fk_pose would visit it,
+       resolving everything per bone that does not change from frame to frame:
+       parent step, pose data index, twist/share and face driver flags, expression
+       counter rotations and t-pose transform.
+       Subtrees that would never be visited are left out."""
+    plan = []
+    bone_indices = { bone_id: i for i, bone_id in enumerate(actor.bone_ids) }
+    stack = [ (actor.skin_tree, -1) ]
+    while stack:
+        skin_tree_def, parent = stack.pop()
+        skin_bone = skin_tree_def["bone"]
+        bone_name = skin_bone.GetName()
+        bone_id = skin_bone.GetID()
+        if bone_id not in actor.t_pose:
+            log_error(f"Bone {bone_name} not in t-pose data!")
+            continue
+        pose_index = bone_indices.get(bone_id, -1)
+        twist = "Twist" in bone_name or "Share" in bone_name
+        # don't follow twist or share bones that are not in the pose
+        if pose_index == -1 and twist:
+            continue
+        obj = skin_tree_def["object"]
+        t_pose_tra, t_pose_rot, t_pose_sca = fetch_pose_transform(actor.t_pose, bone_id)
+        plan.append({
+            "bone": skin_bone,
+            "name": bone_name,
+            "parent": parent,
+            "pose_index": pose_index,
+            "skin_def": actor.skin_objects[obj.GetID()],
+            "twist": twist,
+            "driver": actor.use_drivers and bone_name in actor.face_drivers,
+            "counter_rotations": actor.counter_rotations.get(bone_name),
+            "controls": get_skin_def_controls(actor.skin_objects[obj.GetID()], bone_id),
+            "t_pose": actor.t_pose[bone_id],
+            "t_pose_tra": t_pose_tra,
+            "t_pose_rot": t_pose_rot,
+            "t_pose_sca": t_pose_sca,
+        })
+        step_index = len(plan) - 1
+        # push children in reverse to visit them in order
+        for child_def in reversed(skin_tree_def["children"]):
+            stack.append((child_def, step_index))
+    return plan
+
+
+def apply_retarget_plan(actor: LinkActor, plan: list, pose_data, shape_data):
+    """Same as apply_world_fk_pose, but iterating the flattened retarget plan,
+       with the local transforms for the whole skeleton solved by the FK kernel"""
+    local_transforms, parent_rots = actor.retarget_kernel.solve(pose_data)
+    # bone controls to key, with the euler rotations converted for the whole skeleton at once
+    keys = []
+    for i, step in enumerate(plan):
+        if step["pose_index"] == -1:
+            continue
+        bone_name = step["name"]
+        t_pose_tra = step["t_pose_tra"]
+        t_pose_rot = step["t_pose_rot"]
+        t_pose_sca = step["t_pose_sca"]
+        L = local_transforms[i]
+        local_rot = RQuaternion(RVector4(L[3], L[4], L[5], L[6]))
+        local_sca = RVector3(L[7], L[8], L[9])
+        # don't apply any translation to twist or share bones
+        if step["twist"]:
+            local_tra = t_pose_tra
+        else:
+            local_tra = RVector3(L[0], L[1], L[2])
+        if step["driver"]:
+            P = parent_rots[i]
+            parent_world_rot = RQuaternion(RVector4(P[0], P[1], P[2], P[3]))
+            apply_face_drivers(actor, bone_name, shape_data, local_rot, parent_world_rot, t_pose_rot)
+        ec_rot = calc_counter_rotation(step["counter_rotations"], shape_data)
+        skin_def = step["skin_def"]
+        SC = skin_def["SC"]
+        clip = skin_def["clip"]
+        if SC and clip:
+            if step["controls"]:
+                rot, tra, sca = calc_bone_control(ec_rot, t_pose_rot, t_pose_tra, t_pose_sca,
+                                                  local_rot, local_tra, local_sca)
+                keys.append((step["controls"], skin_def["clip_time"], (rot.x, rot.y, rot.z, rot.w), tra, sca))
+            else:
+                set_bone_control(SC, clip, step["bone"], skin_def["clip_time"], ec_rot,
+                                 t_pose_rot, t_pose_tra, t_pose_sca,
+                                 local_rot, local_tra, local_sca)
+    if keys:
+        eulers = quats_to_euler_xyz([ key[2] for key in keys ])
+        for (controls, clip_time, rot, tra, sca), euler in zip(keys, eulers):
+            set_control_euler(controls, clip_time, euler, tra, sca)
+        if actor.key_recorder:
+            for (controls, clip_time, rot, tra, sca), euler in zip(keys, eulers):
+                record_control_keys(actor.key_recorder, controls, clip_time, euler, tra, sca)
+
+
 def calc_world(local_rot: RQuaternion, local_tra: RVector3, local_sca: RVector3,
                parent_world_rot: RQuaternion, parent_world_tra: RVector3, parent_world_sca: RVector3):
     world_rot = parent_world_rot.Multiply(local_rot)
@@ -822,23 +1302,35 @@ def set_bone_transform(clip, bone, time,
         transform_control.SetValue(time, T)
 
 
+def calc_bone_control(ec_rot: RQuaternion,
+                      t_pose_rot: RQuaternion, t_pose_tra: RVector3, t_pose_sca: RVector3,
+                      local_rot: RQuaternion, local_tra: RVector3, local_sca: RVector3):
+    # get local transform relative to T-pose
+    # CC/iC doesn't support bone scaling in human animations? so use the t-pose scale
+    sca = t_pose_sca #local_sca / t_pose_sca
+    tra = local_tra - t_pose_tra
+    # counteract expression rotations
+    exp_local_rot = local_rot.Multiply(ec_rot) if ec_rot is not None else local_rot
+    # get relative to t-pose
+    rot = exp_local_rot.Multiply(t_pose_rot.Inverse())
+    return rot, tra, sca
+
+
 def set_bone_control(SC, clip, bone, time, ec_rot: RQuaternion,
                      t_pose_rot: RQuaternion, t_pose_tra: RVector3, t_pose_sca: RVector3,
-                     local_rot: RQuaternion, local_tra: RVector3, local_sca: RVector3):
-    clip_bone_control: RControl = clip.GetControl("Layer", bone)
-    if clip_bone_control:
-        # get local transform relative to T-pose
-        # CC/iC doesn't support bone scaling in human animations? so use the t-pose scale
-        sca = t_pose_sca #local_sca / t_pose_sca
-        tra = local_tra - t_pose_tra
-        # counteract expression rotations
-        exp_local_rot = local_rot.Multiply(ec_rot)
-        # get relative to t-pose
-        rot = exp_local_rot.Multiply(t_pose_rot.Inverse())
+                     local_rot: RQuaternion, local_tra: RVector3, local_sca: RVector3,
+                     controls: list = None):
+    clip_bone_control: RControl = clip.GetControl("Layer", bone) if not controls else None
+    if controls or clip_bone_control:
+        rot, tra, sca = calc_bone_control(ec_rot, t_pose_rot, t_pose_tra, t_pose_sca,
+                                          local_rot, local_tra, local_sca)
         # apply to clip
-        clip_data_block: RDataBlock = clip_bone_control.GetDataBlock()
-        if clip_data_block:
-            set_control_data(SC, clip_data_block, time, rot, tra, sca)
+        if controls:
+            set_control_handles(controls, time, rot, tra, sca)
+        else:
+            clip_data_block: RDataBlock = clip_bone_control.GetDataBlock()
+            if clip_data_block:
+                set_control_data(SC, clip_data_block, time, rot, tra, sca)
 
 
 def set_ik_effector(SC: RISkeletonComponent, clip: RIClip, effector_type, time: RTime,
@@ -868,6 +1360,85 @@ def set_control_data(SC: RISkeletonComponent, data_block: RDataBlock, time: RTim
         data_block.GetControl("Position/ScaleZ").SetValue(time, sca.z)
 
 
+def get_control_handles(data_block: RDataBlock):
+    """The rotation, position and scale controls of a clip data block, resolved once:
+       [ RotationX, RotationY, RotationZ, PositionX, PositionY, PositionZ, ScaleX, ScaleY, ScaleZ ],
+       the position and scale controls are None if the data block does not have them"""
+    controls = [ data_block.GetControl("Rotation/RotationX"),
+                 data_block.GetControl("Rotation/RotationY"),
+                 data_block.GetControl("Rotation/RotationZ") ]
+    if data_block.GetControl("Position/PositionX") is not None:
+        controls.extend([ data_block.GetControl("Position/PositionX"),
+                          data_block.GetControl("Position/PositionY"),
+                          data_block.GetControl("Position/PositionZ") ])
+    else:
+        controls.extend([ None, None, None ])
+    if data_block.GetControl("Position/ScaleX") is not None:
+        controls.extend([ data_block.GetControl("Position/ScaleX"),
+                          data_block.GetControl("Position/ScaleY"),
+                          data_block.GetControl("Position/ScaleZ") ])
+    else:
+        controls.extend([ None, None, None ])
+    return controls
+
+
+def get_bone_control_handles(clip: RIClip, bone):
+    clip_bone_control: RControl = clip.GetControl("Layer", bone)
+    if clip_bone_control:
+        clip_data_block: RDataBlock = clip_bone_control.GetDataBlock()
+        if clip_data_block:
+            return get_control_handles(clip_data_block)
+    return None
+
+
+def quat_to_euler_xyz(q):
+    if FAST_EULER:
+        return kinematics.quat_to_euler_xyz(q)
+    M: RMatrix3 = RQuaternion(RVector4(q[0], q[1], q[2], q[3])).ToRotationMatrix()
+    x = y = z = 0
+    return M.ToEulerAngle(EEulerOrder_XYZ, x, y, z)
+
+
+def quats_to_euler_xyz(quats):
+    if FAST_EULER:
+        return kinematics.quats_to_euler_xyz(quats)
+    return [ quat_to_euler_xyz(q) for q in quats ]
+
+
+def set_control_handles(controls: list, time: RTime,
+                        rot: RQuaternion, tra: RVector3, sca: RVector3):
+    """Same as set_control_data, but with the controls from get_control_handles"""
+    euler = quat_to_euler_xyz((rot.x, rot.y, rot.z, rot.w))
+    set_control_euler(controls, time, euler, tra, sca)
+
+
+def set_control_euler(controls: list, time: RTime,
+                      euler, tra: RVector3, sca: RVector3):
+    controls[0].SetValue(time, euler[0])
+    controls[1].SetValue(time, euler[1])
+    controls[2].SetValue(time, euler[2])
+    if controls[3] is not None:
+        controls[3].SetValue(time, tra.x)
+        controls[4].SetValue(time, tra.y)
+        controls[5].SetValue(time, tra.z)
+    if controls[6] is not None:
+        controls[6].SetValue(time, sca.x)
+        controls[7].SetValue(time, sca.y)
+        controls[8].SetValue(time, sca.z)
+
+
+CONTROL_CHANNEL_KINDS = ("rotation", "translation", "scale")
+
+
+def record_control_keys(recorder: simplify.KeyRecorder, controls: list, time: RTime,
+                        euler, tra: RVector3, sca: RVector3):
+    t = time.ToInt()
+    for i, value in enumerate((euler[0], euler[1], euler[2], tra.x, tra.y, tra.z, sca.x, sca.y, sca.z)):
+        control: RControl = controls[i]
+        if control is not None:
+            recorder.record((id(controls), i), control, CONTROL_CHANNEL_KINDS[i // 3], time, t, value)
+
+
 def set_transform_control(time, obj: RIObject, loc: RVector3, rot: RQuaternion, sca: RVector3):
     control = obj.GetControl("Transform")
     if control:
@@ -905,12 +1476,26 @@ def apply_face_drivers(actor: LinkActor, bone_name, shape_data,
             shape_data[expr_index] = angle_fac
 
 
-def apply_shapes(actor: LinkActor, time: RTime, pose_data, shape_data):
+def apply_shapes(actor: LinkActor, time: RTime, pose_data, shape_data, changed_only=False):
     FC = actor.get_face_component()
     VC = actor.get_viseme_component()
     MC = actor.get_morph_component()
 
-    if FC and actor.expressions:
+    if FC and actor.expressions and changed_only:
+        first_key = actor.expression_key_names is None
+        hold_time, hold_names, hold_strengths, names, strengths = actor.get_changed_expression_keys(time, shape_data)
+        if first_key:
+            FC.AddExpressivenessKey(time, 1.0)
+        if hold_names:
+            res = FC.AddExpressionKeys(hold_time, hold_names, hold_strengths, RTime.FromValue(1))
+            if res.IsError():
+                log_error("Failed to set expression hold keys")
+        if names:
+            res = FC.AddExpressionKeys(time, names, strengths, RTime.FromValue(1))
+            if res.IsError():
+                log_error("Failed to set expressions")
+
+    elif FC and actor.expressions:
         expressions = [expression for expression in actor.expressions]
         strengths = [shape_data[idx] for idx in actor.expressions.values()]
         #FC.BeginKeyEditing()
@@ -1020,6 +1605,8 @@ class LinkService(QObject):
     remote_addon: str = None
     remote_fps: RFps = RFps.Fps60
     remote_is_local: bool = True
+    remote_features: list = None
+    remote_session: str = None
     # temp
     temp_path: str = None
 
@@ -1131,7 +1718,9 @@ class LinkService(QObject):
             "Version": self.local_version,
             "Path": self.local_path,
             "Plugin": vars.VERSION,
-            "Exe": RApplication.GetProgramPath()
+            "Exe": RApplication.GetProgramPath(),
+            "Features": LINK_FEATURES,
+            "Session": cc.SCENE_SESSION,
         }
         self.send(OpCodes.HELLO, encode_from_json(json_data))
 
@@ -1291,6 +1880,8 @@ class LinkService(QObject):
                 self.remote_addon = json_data.get("Addon", "x.x.x")
                 self.remote_fps = RFps(float(json_data.get("FPS", 60.0)))
                 self.remote_is_local = json_data.get("Local", True)
+                self.remote_features = json_data.get("Features", [])
+                self.remote_session = json_data.get("Session")
                 if LI(): log_info(f"Connected to: {self.remote_app} {self.remote_version} / {self.remote_addon}")
                 if LI(): log_info(f"Using file path: {self.remote_path}")
                 if LI(): log_info(f"Client is connecting {('Locally' if self.remote_is_local else 'Remotely')}")
@@ -2372,6 +2963,12 @@ class DataLink(QObject):
             return link_service.is_local()
         return True
 
+    def has_remote_feature(self, feature):
+        link_service = self.get_link_service()
+        if link_service and link_service.remote_features:
+            return feature in link_service.remote_features
+        return False
+
     def get_link_service(self) -> LinkService:
         return self.service
 
@@ -2482,15 +3079,30 @@ class DataLink(QObject):
                 shutil.rmtree(export_folder)
         return remote_id
 
+    def get_link_actor(self, obj) -> LinkActor:
+        """Reuses the LinkActor of an object from earlier selections while no objects have been
+           added or removed, so its type, components and channel names stay resolved.
+           Operations must reset_actors() the actors they start with."""
+        revision = cc.get_structure_revision()
+        if self.data.actor_cache_revision != revision:
+            self.data.actor_cache = {}
+            self.data.actor_cache_revision = revision
+        actor: LinkActor = self.data.actor_cache.get(obj.GetID())
+        if actor and actor.name == obj.GetName():
+            return actor
+        actor = LinkActor(obj)
+        self.data.actor_cache[obj.GetID()] = actor
+        return actor
+
     def get_selected_actors(self, of_types=None):
         selected = RScene.GetSelectedObjects()
         avatars = RScene.GetAvatars()
         actors = []
-        selected_actor_objects = []
+        selected_actor_ids = set()
         # if nothing selected and only 1 avatar, use this actor
         # otherwise return a list of all selected actors
         if not selected and len(avatars) == 1:
-            actor = LinkActor(avatars[0])
+            actor = self.get_link_actor(avatars[0])
             if actor:
                 if (not of_types or
                     (type(of_types) is list and actor.get_type() in of_types) or
@@ -2499,14 +3111,14 @@ class DataLink(QObject):
         else:
             for obj in selected:
                 actor_object, T = cc.get_selected_sendable(obj)
-                if actor_object and actor_object not in selected_actor_objects:
-                    actor = LinkActor(actor_object)
+                if actor_object and actor_object.GetID() not in selected_actor_ids:
+                    actor = self.get_link_actor(actor_object)
                     if actor:
                         if (not of_types or
                             (type(of_types) is list and actor.get_type() in of_types) or
                             (actor.get_type() == of_types)):
                             actors.append(actor)
-                            selected_actor_objects.append(actor_object)
+                            selected_actor_ids.add(actor_object.GetID())
         return actors
 
     def get_active_actor(self):
@@ -2760,6 +3372,7 @@ class DataLink(QObject):
             actors = [actors]
         if not actors:
             actors = self.get_selected_actors()
+        reset_actors(actors)
 
         actor: LinkActor
 
@@ -2853,6 +3466,7 @@ class DataLink(QObject):
         if not actors:
             #actors = self.get_selected_actors(of_types=["AVATAR", "PROP", "LIGHT", "CAMERA"])
             actors = self.get_selected_actors(of_types=["AVATAR", "LIGHT", "CAMERA"])
+        reset_actors(actors)
 
         actor: LinkActor
         for actor in actors:
@@ -2949,6 +3563,7 @@ class DataLink(QObject):
             gob.go_morph()
         else:
             actors = self.get_selected_actors(of_types=["AVATAR"])
+            reset_actors(actors)
             actor: LinkActor
             for actor in actors:
                 if actor.is_standard():
@@ -2959,6 +3574,7 @@ class DataLink(QObject):
             gob.go_mesh()
         else:
             actors = self.get_selected_actors(of_types=["AVATAR", "PROP"])
+            reset_actors(actors)
             actor: LinkActor
             for actor in actors:
                 self.send_mesh(actor)
@@ -3010,6 +3626,7 @@ class DataLink(QObject):
 
     def send_morph_update(self):
         actors = self.get_selected_actors(of_types=["AVATAR"])
+        reset_actors(actors)
         actor: LinkActor
         for actor in actors:
             if actor.is_standard():
@@ -3124,6 +3741,7 @@ class DataLink(QObject):
 
     def send_rigify_request(self):
         actors = self.get_selected_actors(of_types=["AVATAR"])
+        reset_actors(actors)
         actor: LinkActor
         for actor in actors:
             if type(actor.object) is RIAvatar or type(actor.object) is RILightAvatar:
@@ -3151,17 +3769,21 @@ class DataLink(QObject):
                 FC: RIFaceComponent = actor.get_face_component()
                 VC: RIVisemeComponent = actor.get_viseme_component()
                 MC: RIMorphComponent = actor.get_morph_component()
-                actor.skin_tree = cc.get_extended_skin_bones_tree(actor.object)
-                actor.skin_bones, actor.id_tree = cc.extract_extended_skin_bones(actor.skin_tree)
+                actor.skin_tree, actor.skin_bones, actor.id_tree = cc.get_cached_skin_bones_tree(actor.object)
                 ids = [ b.GetID() for b in actor.skin_bones ]
                 bones = [ b.GetName() for b in actor.skin_bones ]
+                ASC: RIAvatarShapingComponent = actor.get_shaping_component()
                 expressions = []
                 visemes = []
                 morphs = []
+                actor.morph_ids = []
                 if FC:
-                    expressions = FC.GetExpressionNames("")
+                    expressions = actor.get_expression_names()
                 if VC:
-                    visemes = VC.GetVisemeNames()
+                    visemes = actor.get_viseme_names()
+                if ASC and self.data.sequence_sparse:
+                    actor.morph_ids = ASC.GetShapingMorphIDs("")
+                    morphs = ASC.GetShapingMorphDisplayNames("")
                 actor_data.append({
                     "name": actor.name,
                     "type": actor_type,
@@ -3182,8 +3804,59 @@ class DataLink(QObject):
                     "link_id": actor.get_link_id(),
                 })
 
+        if self.has_remote_feature("template_hash"):
+            self.hash_actor_templates(actor_data)
+
         return encode_from_json(actor_template)
 
+    def hash_actor_templates(self, actor_data: list):
+        """Adds the content hash to each skinned actor template and replaces the template body
+           with just the hash when the remote has already confirmed it knows it"""
+        self.check_remote_template_identity()
+        for i, template in enumerate(actor_data):
+            if template["type"] == "PROP" or template["type"] == "AVATAR":
+                template_hash = get_template_hash(template)
+                template["hash"] = template_hash
+                self.data.sent_templates[template["link_id"]] = template
+                if template_hash in self.data.remote_template_hashes:
+                    actor_data[i] = {
+                        "name": template["name"],
+                        "type": template["type"],
+                        "link_id": template["link_id"],
+                        "hash": template_hash,
+                        "known": True,
+                    }
+        num_known = len([ template for template in actor_data if template.get("known") ])
+        if LI(): log_info(f"Templates: {len(actor_data)} actors, {num_known} known by hash")
+
+    def check_remote_template_identity(self):
+        """The hashes known by the remote only hold while it is the same remote application session"""
+        link_service = self.get_link_service()
+        identity = None
+        if link_service:
+            identity = (link_service.remote_app, link_service.remote_version,
+                        link_service.remote_addon, link_service.remote_session)
+        if identity != self.data.remote_template_identity:
+            self.data.remote_template_identity = identity
+            self.data.remote_template_hashes.clear()
+
+    def receive_template_hashes(self, template_json):
+        """Reply from the receiver with the template hashes it knows and those it was sent
+           without a body but doesn't have, which are sent again in full"""
+        for template_hash in template_json.get("known", []):
+            self.data.remote_template_hashes.add(template_hash)
+        missing_hashes = template_json.get("missing", [])
+        for template_hash in missing_hashes:
+            self.data.remote_template_hashes.discard(template_hash)
+        missing = [ template for template in self.data.sent_templates.values()
+                    if template["hash"] in missing_hashes ]
+        if missing:
+            if LI(): log_info(f"Resending {len(missing)} templates unknown to the remote")
+            self.send(OpCodes.TEMPLATE, encode_from_json({ "count": len(missing), "actors": missing }))
+
+    def send_template_hashes(self, known, missing):
+        self.send(OpCodes.TEMPLATE, encode_from_json({ "hashes": True, "known": known, "missing": missing }))
+
     def encode_pose_data(self, actors):
         link_fps = self.get_link_fps()
         start_time: RTime = RGlobal.GetStartTime()
@@ -3205,6 +3878,7 @@ class DataLink(QObject):
             "use_fake_user": self.use_fake_user,
             "set_keyframes": self.set_keyframes,
             "actors": actors_data,
+            "sparse_channels": self.data.sequence_sparse,
         }
         actor: LinkActor
         for actor in actors:
@@ -3215,103 +3889,245 @@ class DataLink(QObject):
             })
         return encode_from_json(data)
 
+    def sample_actor_frame(self, actor: LinkActor, link_fps: RFps, frame, use_subsets=True):
+        """Samples the actor's pose at the current scene time into a dict of packable values.
+           With use_subsets, only the bones and channels the receiver uses are sampled."""
+        actor_type = actor.get_type()
+        sample = {
+            "type": actor_type,
+        }
+
+        # object transform
+        T: RTransform = actor.get_object().WorldTransform()
+        t: RVector3 = T.T()
+        r: RQuaternion = T.R()
+        s: RVector3 = T.S()
+        sample["transform"] = (t.x, t.y, t.z, r.x, r.y, r.z, r.w, s.x, s.y, s.z)
+
+        if actor_type == "PROP" or actor_type == "AVATAR":
+
+            FC: RIFaceComponent = actor.get_face_component()
+            VC: RIVisemeComponent = actor.get_viseme_component()
+
+            # bone transforms
+            skin_bones = actor.skin_bones
+            if use_subsets and actor.subset_bones is not None:
+                skin_bones = actor.subset_bones
+                sample["bone_subset"] = True
+            bones = []
+            bone: RIObject
+            for bone in skin_bones:
+                T: RTransform = bone.WorldTransform()
+                t: RVector3 = T.T()
+                r: RQuaternion = T.R()
+                s: RVector3 = T.S()
+                bones.append((t.x, t.y, t.z, r.x, r.y, r.z, r.w, s.x, s.y, s.z))
+            sample["bones"] = bones
+
+            # facial expressions
+            if FC and use_subsets and actor.subset_expression_names is not None:
+                weights = [0.0] * len(actor.get_expression_names())
+                subset_weights = FC.GetExpressionWeights(RGlobal.GetTime(), actor.subset_expression_names)
+                for i, weight in zip(actor.channel_subsets["expressions"], subset_weights):
+                    weights[i] = weight
+                sample["expressions"] = weights
+            elif FC:
+                names = actor.get_expression_names()
+                sample["expressions"] = list(FC.GetExpressionWeights(RGlobal.GetTime(), names))
+            else:
+                sample["expressions"] = []
+
+            # visemes
+            if VC:
+                sample["visemes"] = list(VC.GetVisemeMorphWeights())
+            else:
+                sample["visemes"] = []
+
+            # morph slider weights
+            if self.data.sequence_sparse and actor.morph_ids:
+                ASC: RIAvatarShapingComponent = actor.get_shaping_component()
+                if use_subsets and "morphs" in actor.channel_subsets:
+                    weights = [0.0] * len(actor.morph_ids)
+                    for i in actor.channel_subsets["morphs"]:
+                        weights[i] = ASC.GetShapingMorphWeight(actor.morph_ids[i])
+                    sample["morphs"] = weights
+                else:
+                    sample["morphs"] = [ ASC.GetShapingMorphWeight(morph_id) for morph_id in actor.morph_ids ]
+
+        elif actor_type == "LIGHT":
+
+            # animateable light data
+            static_data = actor.get_static_data()
+            if static_data:
+                light_data = cc.get_light_animated_data(actor.object, static_data["type"])
+                sample["light"] = (light_data["active"],
+                                   light_data["color"][0],
+                                   light_data["color"][1],
+                                   light_data["color"][2],
+                                   light_data["multiplier"],
+                                   light_data["range"],
+                                   light_data["angle"],
+                                   light_data["falloff"],
+                                   light_data["attenuation"],
+                                   light_data["darkness"])
+
+        elif actor_type == "CAMERA":
+
+            # animateable camera data
+            if actor.get_static_data():
+                camera_data = cc.get_camera_animated_data(actor.object, frame, self.get_camera_switches(link_fps))
+                sample["camera"] = (camera_data["focal_length"],
+                                    camera_data["dof_enable"],
+                                    camera_data["dof_focus"], # Focus Distance
+                                    camera_data["dof_range"], # Perfect Focus Range
+                                    camera_data["dof_far_blur"],
+                                    camera_data["dof_near_blur"],
+                                    camera_data["dof_far_transition"],
+                                    camera_data["dof_near_transition"],
+                                    camera_data["dof_min_blend_distance"])
+
+        return sample
+
+    def get_sample_bones(self, actor: LinkActor, sample):
+        """The sampled bone transforms in the receiver's bone subset, if it declared one"""
+        if actor.bone_subset is None or sample.get("bone_subset"):
+            return sample["bones"]
+        return [ sample["bones"][i] for i in actor.bone_subset ]
+
+    def pack_actor_info(self, actor: LinkActor):
+        data = bytearray()
+        data += pack_string(actor.name)
+        data += pack_string(actor.get_type())
+        data += pack_string(actor.get_link_id())
+        return data
+
+    def get_camera_switches(self, link_fps: RFps):
+        """Camera switch intervals, fetched once per pose or sequence send"""
+        if self.data.camera_switches is None:
+            self.data.camera_switches = cc.get_camera_switch_intervals(link_fps)
+        return self.data.camera_switches
+
     def encode_pose_frame_data(self, actors: list):
         link_fps = self.get_link_fps()
         time: RTime = RGlobal.GetTime()
         frame = link_fps.GetFrameIndex(time)
+        samples = [ self.sample_actor_frame(actor, link_fps, frame) for actor in actors ]
+        return self.pack_pose_frame_data(actors, frame, samples)
+
+    def pack_pose_frame_data(self, actors: list, frame, samples: list):
+        sparse = self.data.sequence_sparse
         data = bytearray()
         data += struct.pack("!II", len(actors), frame)
         actor: LinkActor
-        for actor in actors:
+        for actor, sample in zip(actors, samples):
+
+            actor_type = sample["type"]
 
             # pack actor info
-            actor_type = actor.get_type()
-            data += pack_string(actor.name)
-            data += pack_string(actor_type)
-            data += pack_string(actor.get_link_id())
+            data += self.pack_actor_info(actor)
 
             # pack object transform
-            T: RTransform = actor.get_object().WorldTransform()
-            t: RVector3 = T.T()
-            r: RQuaternion = T.R()
-            s: RVector3 = T.S()
-            data += struct.pack("!ffffffffff", t.x, t.y, t.z, r.x, r.y, r.z, r.w, s.x, s.y, s.z)
+            data += struct.pack("!ffffffffff", *sample["transform"])
 
             if actor_type == "PROP" or actor_type == "AVATAR":
 
-                SC: RISkeletonComponent = actor.get_skeleton_component()
-                FC: RIFaceComponent = actor.get_face_component()
-                VC: RIVisemeComponent = actor.get_viseme_component()
-                MC: RIMorphComponent = actor.get_morph_component()
-
-                skin_bones = actor.skin_bones
-
                 # pack bone transforms
-                data += struct.pack("!I", len(skin_bones))
-                bone: RIObject
-                for bone in skin_bones:
-                    T: RTransform = bone.WorldTransform()
-                    t: RVector3 = T.T()
-                    r: RQuaternion = T.R()
-                    s: RVector3 = T.S()
-                    data += struct.pack("!ffffffffff", t.x, t.y, t.z, r.x, r.y, r.z, r.w, s.x, s.y, s.z)
+                bones = self.get_sample_bones(actor, sample)
+                if actor.bone_subset is not None:
+                    data += struct.pack("!II", len(actor.skin_bones) | SUBSET_FLAG, len(bones))
+                else:
+                    data += struct.pack("!I", len(bones))
+                for bone in bones:
+                    data += struct.pack("!ffffffffff", *bone)
 
                 # pack facial expressions
-                if FC:
-                    names = FC.GetExpressionNames("")
-                    weights = FC.GetExpressionWeights(RGlobal.GetTime(), names)
-                    data += struct.pack("!I", len(names))
-                    for weight in weights:
-                        data += struct.pack("!f", weight)
-                else:
-                    data += struct.pack("!I", 0)
+                subsets = actor.channel_subsets
+                data += pack_weights(sample["expressions"], sparse, subsets.get("expressions"))
 
                 # pack visemes
-                if VC:
-                    names = VC.GetVisemeNames()
-                    weights = VC.GetVisemeMorphWeights()
-                    data += struct.pack("!I", len(weights))
-                    for weight in weights:
-                        data += struct.pack("!f", weight)
-                else:
-                    data += struct.pack("!I", 0)
+                data += pack_weights(sample["visemes"], sparse, subsets.get("visemes"))
 
-                # TODO: pack morphs
-                if MC:
-                    pass
+                # pack morph sliders
+                if sparse:
+                    data += pack_weights(sample.get("morphs", []), sparse, subsets.get("morphs"))
 
             elif actor_type == "LIGHT":
 
                 # pack animateable light data
-                light_data = cc.get_light_data(actor.object)
-                if light_data:
-                    data += struct.pack("!?fffffffff",
-                                    light_data["active"],
-                                    light_data["color"][0],
-                                    light_data["color"][1],
-                                    light_data["color"][2],
-                                    light_data["multiplier"],
-                                    light_data["range"],
-                                    light_data["angle"],
-                                    light_data["falloff"],
-                                    light_data["attenuation"],
-                                    light_data["darkness"])
+                if "light" in sample:
+                    data += struct.pack(POSE_LIGHT_FORMAT, *sample["light"])
 
             elif actor_type == "CAMERA":
 
                 # pack animateable camera data
-                camera_data = cc.get_camera_data(actor.object, link_fps, frame)
-                if camera_data:
-                    data += struct.pack("!f?fffffff",
-                                     camera_data["focal_length"],
-                                     camera_data["dof_enable"],
-                                     camera_data["dof_focus"], # Focus Distance
-                                     camera_data["dof_range"], # Perfect Focus Range
-                                     camera_data["dof_far_blur"],
-                                     camera_data["dof_near_blur"],
-                                     camera_data["dof_far_transition"],
-                                     camera_data["dof_near_transition"],
-                                     camera_data["dof_min_blend_distance"])
+                if "camera" in sample:
+                    data += struct.pack(POSE_CAMERA_FORMAT, *sample["camera"])
+
+        return data
+
+    def encode_sequence_batch_data(self, actors: list, start_frame, samples: list):
+        """Packs a run of consecutive frame samples, per actor, into columns of frame values:
+           [count, start_frame, num_frames]
+           per actor: info, transform[num_frames x 10],
+                      bone count, per bone transforms[num_frames x 10],
+                      or [bone count | SUBSET_FLAG, n], per subset bone transforms[num_frames x 10],
+                      expression count, per expression weights[num_frames],
+                      viseme count, per viseme weights[num_frames],
+                      (if sparse) morph count, per morph weights[num_frames],
+                      or per light/camera field values[num_frames]"""
+        sparse = self.data.sequence_sparse
+        num_frames = len(samples)
+        data = bytearray()
+        data += struct.pack("!III", len(actors), start_frame, num_frames)
+        for i, actor in enumerate(actors):
+
+            actor_samples = [ frame_samples[i] for frame_samples in samples ]
+            actor_type = actor_samples[0]["type"]
+
+            # pack actor info
+            data += self.pack_actor_info(actor)
+
+            # pack object transform
+            values = [ v for sample in actor_samples for v in sample["transform"] ]
+            data += struct.pack(f"!{len(values)}f", *values)
+
+            if actor_type == "PROP" or actor_type == "AVATAR":
+
+                # pack bone transforms
+                samples_bones = [ self.get_sample_bones(actor, sample) for sample in actor_samples ]
+                num_bones = len(samples_bones[0])
+                if actor.bone_subset is not None:
+                    data += struct.pack("!II", len(actor.skin_bones) | SUBSET_FLAG, num_bones)
+                else:
+                    data += struct.pack("!I", num_bones)
+                for b in range(0, num_bones):
+                    values = [ v for bones in samples_bones for v in bones[b] ]
+                    data += struct.pack(f"!{len(values)}f", *values)
+
+                # pack facial expressions, visemes and morph sliders
+                for key in SAMPLE_CHANNELS:
+                    if key == "morphs" and not sparse:
+                        continue
+                    num_weights = len(actor_samples[0].get(key, []))
+                    columns = [ [ sample[key][w] for sample in actor_samples ] for w in range(0, num_weights) ]
+                    data += pack_weight_columns(columns, num_frames, sparse, actor.channel_subsets.get(key))
+
+            elif actor_type == "LIGHT" or actor_type == "CAMERA":
+
+                # pack animateable light/camera data, one column per field
+                key = "light" if actor_type == "LIGHT" else "camera"
+                fmt = POSE_LIGHT_FORMAT if actor_type == "LIGHT" else POSE_CAMERA_FORMAT
+                rows = []
+                last_row = None
+                for sample in actor_samples:
+                    last_row = sample.get(key, last_row)
+                    rows.append(last_row)
+                if last_row:
+                    first_row = next(row for row in rows if row)
+                    rows = [ row if row else first_row for row in rows ]
+                    for f, field_fmt in enumerate(fmt[1:]):
+                        values = [ row[f] for row in rows ]
+                        data += struct.pack(f"!{num_frames}{field_fmt}", *values)
 
         return data
 
@@ -3337,6 +4153,8 @@ class DataLink(QObject):
             "set_keyframes": self.set_keyframes,
             "actors": actors_data,
             "aborted": aborted,
+            "batch_frames": self.data.sequence_batched,
+            "sparse_channels": self.data.sequence_sparse,
         }
         actor: LinkActor
         for actor in actors:
@@ -3589,13 +4407,16 @@ class DataLink(QObject):
             self.sync_lighting()
             self.send_camera_sync()
 
+        # one snapshot of the scene for all the confirmed actors
+        scene_index = cc.SceneIndex()
         for actor_data in actors_data:
             name = actor_data["name"]
             link_id = actor_data["link_id"]
             character_type = actor_data["type"]
             confirm = actor_data.get("confirm")
             #skinned = actor_data.get("skinned")
-            actor: LinkActor = LinkActor.find_actor(link_id, search_name=name, search_type=character_type)
+            actor: LinkActor = LinkActor.find_actor(link_id, search_name=name, search_type=character_type,
+                                                    scene_index=scene_index)
             if actor:
 
                 # send method rules:
@@ -3654,6 +4475,7 @@ class DataLink(QObject):
         if not self.data.sequence_actors:
             #self.data.sequence_actors = self.get_selected_actors(of_types=["AVATAR", "PROP", "LIGHT", "CAMERA"])
             self.data.sequence_actors = self.get_selected_actors(of_types=["AVATAR", "LIGHT", "CAMERA"])
+            reset_actors(self.data.sequence_actors)
         actors = self.data.sequence_actors
         if actors:
             self.update_link_status(f"Sending Pose Set")
@@ -3666,6 +4488,8 @@ class DataLink(QObject):
     def do_send_pose(self, actors):
         if type(actors) is not list:
             actors = [actors]
+        self.data.sequence_sparse = self.has_remote_feature("sparse_channels")
+        self.data.camera_switches = None
         # send pose info
         pose_data = self.encode_pose_data(actors)
         self.send(OpCodes.POSE, pose_data)
@@ -3681,9 +4505,10 @@ class DataLink(QObject):
 
     def abort_sequence(self):
         if self.is_sequence_running():
-            link_fps = self.get_link_fps()
-            # as the next frame was never sent
-            self.data.sequence_current_frame_time = prev_frame(self.data.sequence_current_frame_time, link_fps)
+            # as the next frame was never sent (the frame time is not advanced when streaming from the cache)
+            if not self.data.sequence_baked:
+                link_fps = self.get_link_fps()
+                self.data.sequence_current_frame_time = prev_frame(self.data.sequence_current_frame_time, link_fps)
             self.data.sequence_current_frame -= 1
             self.update_link_status(f"Sequence Aborted: {self.data.sequence_current_frame}")
             self.stop_sequence()
@@ -3702,6 +4527,7 @@ class DataLink(QObject):
         if not self.data.sequence_actors:
             #self.data.sequence_actors = self.get_selected_actors(of_types=["AVATAR", "PROP", "LIGHT", "CAMERA"])
             self.data.sequence_actors = self.get_selected_actors(of_types=["AVATAR", "LIGHT", "CAMERA"])
+            reset_actors(self.data.sequence_actors)
         actors = self.data.sequence_actors
         RScene.ClearSelectObjects()
         if actors:
@@ -3717,43 +4543,154 @@ class DataLink(QObject):
             self.data.sequence_current_frame = current_frame
             self.data.sequence_start_frame = current_frame
             self.data.sequence_end_frame = get_end_frame(link_fps)
+            # batch frames only if the client can decode them
+            OPTS = options.get_opts()
+            self.data.sequence_batched = OPTS.DATALINK_BATCH_FRAMES and self.has_remote_feature("batch_frames")
+            self.data.sequence_sparse = self.has_remote_feature("sparse_channels")
+            self.data.camera_switches = None
+            self.data.sequence_window = flow.SequenceWindow(current_frame)
+            self.data.sequence_batch_sizes = {}
+            # template data resolves the actor skin bones to sample
+            template_data = self.encode_actor_templates(actors)
+            # sweep the timeline into the sequence cache first, if it is not already cached
+            self.data.sequence_baked = False
+            if OPTS.DATALINK_PREBAKE_SEQUENCE:
+                self.data.sequence_baked = self.bake_sequence(actors, link_fps)
             # send animation meta data
             sequence_data = self.encode_sequence_data(actors)
             self.send(OpCodes.SEQUENCE, sequence_data)
             # send template data first
-            template_data = self.encode_actor_templates(actors)
             self.send(OpCodes.TEMPLATE, template_data)
             # start the sending sequence
             self.data.sequence_actors = actors
             self.data.sequence_type = "SEQUENCE"
             self.start_sequence(func=self.send_sequence_frame)
-            self.data.ack_rate = 60
-            self.data.ack_time = 0
+
+    def get_sequence_bake_key(self, actors, link_fps: RFps):
+        return {
+            "revision": cc.get_scene_revision(),
+            "actors": [ actor.get_link_id() for actor in actors ],
+            "fps": link_fps.ToFloat(),
+            "start_frame": self.data.sequence_start_frame,
+            "end_frame": self.data.sequence_end_frame,
+            "sparse": self.data.sequence_sparse,
+        }
+
+    def bake_sequence(self, actors, link_fps: RFps):
+        """Samples every frame of the sequence, as fast as the timeline can be evaluated, into a
+           memory mapped cache in the DataLink folder, to be streamed from later.
+           Reuses the existing cache if the scene has not changed since it was baked."""
+        key = self.get_sequence_bake_key(actors, link_fps)
+        if not self.data.sequence_bake:
+            cache_folder = utils.make_sub_folder(self.get_link_service().local_path, "cache")
+            if not cache_folder:
+                return False
+            self.data.sequence_bake = bake.SequenceBake(os.path.join(cache_folder, "sequence.bake"))
+        sequence_bake = self.data.sequence_bake
+        if sequence_bake.matches(key) or sequence_bake.load(key):
+            if LI(): log_info(f"Using cached sequence: {sequence_bake.num_frames} frames")
+            return True
+        start_frame = self.data.sequence_start_frame
+        num_frames = self.data.sequence_end_frame - start_frame + 1
+        selection = RScene.GetSelectedObjects()
+        baked = False
+        utils.start_timer("bake_sequence")
+        try:
+            for i in range(0, num_frames):
+                frame = start_frame + i
+                set_frame(frame, link_fps)
+                samples = [ self.sample_actor_frame(actor, link_fps, frame, use_subsets=False) for actor in actors ]
+                if i == 0:
+                    layout = get_frame_samples_layout(samples)
+                    row_size = get_frame_samples_size(layout)
+                    if not sequence_bake.create(key, layout, start_frame, num_frames, row_size):
+                        return False
+                row = flatten_frame_samples(samples, layout)
+                if len(row) != row_size:
+                    log_error(f"Sequence frame {frame} does not match the cache layout!")
+                    return False
+                sequence_bake.write_row(i, row)
+                if i % 30 == 0:
+                    self.update_link_status(f"Baking Sequence Frame: {frame}", log=False)
+            sequence_bake.finish()
+            baked = True
+        finally:
+            # put the timeline and selection back, the sequence then streams from the cache or the timeline
+            if not baked:
+                sequence_bake.close()
+            RGlobal.SetTime(self.data.sequence_current_frame_time)
+            if selection:
+                RScene.SelectObjects(selection)
+            elif RScene.GetSelectedObjects():
+                RScene.ClearSelectObjects()
+        utils.log_timer("Sequence bake", name="bake_sequence")
+        if LI(): log_info(f"Sequence baked: {num_frames} frames")
+        return True
+
+    def get_sequence_frame_samples(self, link_fps: RFps, frame):
+        if self.data.sequence_baked:
+            sequence_bake = self.data.sequence_bake
+            row = sequence_bake.read_row(frame - sequence_bake.start_frame)
+            return unflatten_frame_samples(row, sequence_bake.layout)
+        return [ self.sample_actor_frame(actor, link_fps, frame) for actor in self.data.sequence_actors ]
+
+    def advance_sequence_frame(self, link_fps: RFps):
+        self.data.sequence_current_frame += 1
+        if not self.data.sequence_baked:
+            self.data.sequence_current_frame_time = next_frame(self.data.sequence_current_frame_time, link_fps)
 
     def send_sequence_frame(self):
+        OPTS = options.get_opts()
+
         if not self.data.sequence_active or not self.data.sequence_actors:
             return
-        # set/fetch the current frame in the sequence
-        if RGlobal.GetTime() != self.data.sequence_current_frame_time:
+        window = self.data.sequence_window
+        # hold back while the window of unacknowledged frames is full
+        if OPTS.MATCH_CLIENT_RATE and not window.can_send():
+            return
+        # set/fetch the current frame in the sequence, unless streaming from the cache
+        if not self.data.sequence_baked and RGlobal.GetTime() != self.data.sequence_current_frame_time:
             RGlobal.SetTime(self.data.sequence_current_frame_time)
         # clear selected objects will trigger the OnObjectSelectionChanged event every frame
         # which slows down the sequence, so don't use it unless we have to.
         if RScene.GetSelectedObjects():
             RScene.ClearSelectObjects()
         link_fps = self.get_link_fps()
-        link_frame = get_current_frame(link_fps)
-        self.data.sequence_current_frame = link_frame
-        self.update_link_status(f"Sending Sequence Frame: {link_frame}", log=False)
+        actors = self.data.sequence_actors
+        end_frame = self.data.sequence_end_frame
+        batch_size = 1
+        if self.data.sequence_batched:
+            batch_size = window.batch_size(MAX_BATCH_FRAMES)
+            if OPTS.MATCH_CLIENT_RATE:
+                batch_size = max(1, min(batch_size, window.available()))
+        start_frame = self.data.sequence_current_frame
+        samples = []
+        # sample the current frame, or a run of consecutive frames
+        while True:
+            link_frame = self.data.sequence_current_frame
+            samples.append(self.get_sequence_frame_samples(link_fps, link_frame))
+            if link_frame >= end_frame or len(samples) >= batch_size:
+                break
+            self.advance_sequence_frame(link_fps)
         # send current sequence frame actor poses
-        pose_data = self.encode_pose_frame_data(self.data.sequence_actors)
+        if self.data.sequence_batched:
+            self.update_link_status(f"Sending Sequence Frames: {start_frame} - {link_frame}", log=False)
+            pose_data = self.encode_sequence_batch_data(actors, start_frame, samples)
+        else:
+            self.update_link_status(f"Sending Sequence Frame: {link_frame}", log=False)
+            pose_data = self.pack_pose_frame_data(actors, link_frame, samples[0])
+        # time the last frame sent for the ack round trip
+        window.on_send(link_frame)
+        if self.data.sequence_batched:
+            self.data.sequence_batch_sizes[link_frame] = len(samples)
         self.send(OpCodes.SEQUENCE_FRAME, pose_data)
         # check for end
-        if link_frame >= get_end_frame(link_fps):
+        if link_frame >= end_frame:
             self.send_sequence_end()
             self.stop_sequence()
             return
         # advance to next frame
-        self.data.sequence_current_frame_time = next_frame(self.data.sequence_current_frame_time, link_fps)
+        self.advance_sequence_frame(link_fps)
 
     def send_sequence_end(self, aborted=False):
         actors = self.data.sequence_actors
@@ -3782,8 +4719,7 @@ class DataLink(QObject):
         if actor.get_type() == "PROP" or actor.get_type() == "AVATAR":
 
             # fetch the extended skin bone tree
-            actor.skin_tree = cc.get_extended_skin_bones_tree(actor.object)
-            actor.skin_bones, actor.id_tree = cc.extract_extended_skin_bones(actor.skin_tree)
+            actor.skin_tree, actor.skin_bones, actor.id_tree = cc.get_cached_skin_bones_tree(actor.object)
             actor.skin_objects = cc.extract_extended_skin_objects(actor.skin_tree)
 
             for obj_id, skin_def in actor.skin_objects.items():
@@ -3794,6 +4730,7 @@ class DataLink(QObject):
                 if clip0:
                     SC.DeleteClip(clip0)
                 clip: RIClip = SC.AddClip(t0)
+                skin_def["controls"] = {}
                 if clip:
                     clip.SetLength(length)
                     skin_def["clip"] = clip
@@ -3802,8 +4739,21 @@ class DataLink(QObject):
                     skin_def["clip"] = None
                     log_error(f"Unable to create animation clip: {obj.GetName()} ({obj_id})")
 
+            # resolve the clip transform controls of every skin bone once, for all the frames
+            stack = [ actor.skin_tree ] if actor.skin_tree else []
+            while stack:
+                skin_tree_def = stack.pop()
+                skin_def = actor.skin_objects[skin_tree_def["object"].GetID()]
+                if skin_def["clip"]:
+                    skin_bone = skin_tree_def["bone"]
+                    controls = get_bone_control_handles(skin_def["clip"], skin_bone)
+                    if controls:
+                        skin_def["controls"][skin_bone.GetID()] = controls
+                stack.extend(skin_tree_def["children"])
+
         if actor.get_type() == "AVATAR":
 
+            actor.reset_expression_keys()
             FC = actor.get_face_component()
             FC.AddClip(t0, "Expressions", length)
             FC.AddExpressivenessKey(t0, 1.0)
@@ -3823,9 +4773,21 @@ class DataLink(QObject):
                 RGlobal.ObjectModified(obj, EObjectModifiedType_Transform)
                 obj.Update()
 
-            t_pose = get_pose_local(actor)
+            t_pose = self.get_cached_t_pose(actor)
             actor.set_t_pose(t_pose)
 
+    def get_cached_t_pose(self, actor: LinkActor):
+        """The actor's t-pose, captured again when its skeleton (skin bone list) changes
+           or when objects are added or deleted or a file is loaded, which clears cc.T_POSE_CACHE"""
+        link_id = actor.get_link_id()
+        signature = get_skeleton_signature(actor.skin_bones)
+        cached = cc.T_POSE_CACHE.get(link_id)
+        if cached and cached[0] == signature:
+            return cached[1]
+        t_pose = get_pose_local(actor)
+        cc.T_POSE_CACHE[link_id] = (signature, t_pose)
+        return t_pose
+
     def decode_pose_frame_data(self, pose_data):
         count, frame = struct.unpack_from("!II", pose_data)
         offset = 8
@@ -3877,16 +4839,12 @@ class DataLink(QObject):
                         offset += 40
                         pose.append([tx,ty,tz,rx,ry,rz,rw,sx,sy,sz])
 
-                num_shapes = struct.unpack_from("!I", pose_data, offset)[0]
-                offset += 4
-                for i in range(0, num_shapes):
-                    weight = struct.unpack_from("!f", pose_data, offset)[0]
-                    offset += 4
-                    shapes.append(weight)
+                offset, weights = unpack_weights(pose_data, offset)
+                shapes.extend(weights)
 
             elif character_type == "LIGHT":
 
-                active, col_r, col_g, col_b, energy, rng, angle, blend = struct.unpack_from("!?fffffff", pose_data, offset)
+                active, col_r, col_g, col_b, energy, rng, angle, blend = struct.unpack_from(RECEIVE_LIGHT_FORMAT, pose_data, offset)
                 offset += (7*4 + 1)
                 light_data = {
                     "active": active,
@@ -3900,7 +4858,7 @@ class DataLink(QObject):
 
             elif character_type == "CAMERA":
 
-                lens, use_dof, focus_distance, f_stop = struct.unpack_from("!f?ff", pose_data, offset)
+                lens, use_dof, focus_distance, f_stop = struct.unpack_from(RECEIVE_CAMERA_FORMAT, pose_data, offset)
                 offset += (3*4 + 1)
                 camera_data = {
                     "focal_length": lens,
@@ -3912,16 +4870,135 @@ class DataLink(QObject):
 
         return pose_json
 
+    def decode_sequence_batch_data(self, batch_data):
+        """Unpacks a columnar batch of consecutive frames (see encode_sequence_batch_data)
+           into a list of per frame pose data, as returned by decode_pose_frame_data"""
+        count, start_frame, num_frames = struct.unpack_from("!III", batch_data)
+        offset = 12
+        frames = []
+        for f in range(0, num_frames):
+            frames.append({
+                "count": count,
+                "frame": start_frame + f,
+                "actors": [],
+            })
+
+        def unpack_column(fmt, size):
+            nonlocal offset
+            values = struct.unpack_from(f"!{num_frames * size}{fmt}", batch_data, offset)
+            offset += struct.calcsize(f"!{num_frames * size}{fmt}")
+            return values
+
+        for i in range(0, count):
+            offset, name = unpack_string(batch_data, offset)
+            offset, character_type = unpack_string(batch_data, offset)
+            offset, link_id = unpack_string(batch_data, offset)
+            actor = self.data.find_sequence_actor(link_id)
+            frames_data = []
+            for f in range(0, num_frames):
+                actor_data = {
+                    "name": name,
+                    "type": character_type,
+                    "link_id": link_id,
+                    "actor": actor,
+                    "transform": None,
+                }
+                frames_data.append(actor_data)
+                if actor:
+                    frames[f]["actors"].append(actor_data)
+
+            values = unpack_column("f", 10)
+            for f, actor_data in enumerate(frames_data):
+                actor_data["transform"] = list(values[f*10:f*10+10])
+
+            if character_type == "PROP" or character_type == "AVATAR":
+
+                for actor_data in frames_data:
+                    actor_data["pose"] = []
+                    actor_data["shapes"] = []
+
+                num_bones = struct.unpack_from("!I", batch_data, offset)[0]
+                offset += 4
+                for b in range(0, num_bones):
+                    values = unpack_column("f", 10)
+                    for f, actor_data in enumerate(frames_data):
+                        actor_data["pose"].append(list(values[f*10:f*10+10]))
+
+                offset, columns = unpack_weight_columns(batch_data, offset, num_frames)
+                for column in columns:
+                    for f, actor_data in enumerate(frames_data):
+                        actor_data["shapes"].append(column[f])
+
+            elif character_type == "LIGHT":
+
+                columns = [ unpack_column(fmt, 1) for fmt in RECEIVE_LIGHT_FORMAT[1:] ]
+                for f, actor_data in enumerate(frames_data):
+                    active, col_r, col_g, col_b, energy, rng, angle, blend = [ column[f] for column in columns ]
+                    actor_data["light"] = {
+                        "active": active,
+                        "color": RRgb(col_r, col_g, col_b),
+                        "energy": energy,
+                        "range": rng,
+                        "angle": angle,
+                        "blend": blend
+                    }
+
+            elif character_type == "CAMERA":
+
+                columns = [ unpack_column(fmt, 1) for fmt in RECEIVE_CAMERA_FORMAT[1:] ]
+                for f, actor_data in enumerate(frames_data):
+                    lens, use_dof, focus_distance, f_stop = [ column[f] for column in columns ]
+                    actor_data["camera"] = {
+                        "focal_length": lens,
+                        "use_dof": use_dof,
+                        "focus_distance": focus_distance,
+                        "f_stop": f_stop,
+                    }
+
+        return frames
+
     def receive_actor_templates(self, data):
-        self.update_link_status(f"Character Templates Received")
         template_json = decode_to_json(data)
+        if template_json.get("subsets"):
+            self.receive_actor_subsets(template_json)
+            return
+        if template_json.get("hashes"):
+            self.receive_template_hashes(template_json)
+            return
+        self.update_link_status(f"Character Templates Received")
         count = template_json["count"]
+        known = []
+        missing = []
         actor_data: dict = None
         for actor_data in template_json["actors"]:
             name = actor_data.get("name")
             character_type = actor_data.get("type")
             link_id = actor_data.get("link_id")
+            template_hash = actor_data.get("hash")
             actor = self.data.find_sequence_actor(link_id)
+            if not actor:
+                actor = self.data.template_pending.pop(link_id, None)
+                if actor:
+                    self.data.sequence_actors.append(actor)
+            if template_hash:
+                received_template = self.data.received_templates.get(template_hash)
+                if actor_data.get("known"):
+                    if received_template:
+                        actor_data = received_template
+                    else:
+                        # no template for this actor until it is sent again in full
+                        if LI(): log_info(f"Character Template unknown: {name} ({template_hash})")
+                        missing.append(template_hash)
+                        if actor:
+                            self.data.sequence_actors.remove(actor)
+                            self.data.template_pending[link_id] = actor
+                        continue
+                else:
+                    self.data.received_templates.pop(template_hash, None)
+                    self.data.received_templates[template_hash] = actor_data
+                    while len(self.data.received_templates) > RECEIVED_TEMPLATES_SIZE:
+                        self.data.received_templates.pop(next(iter(self.data.received_templates)))
+                known.append(template_hash)
             if actor:
                 if LI(): log_info(f"Character Template Received: {name}")
                 if actor.get_type() == "PROP" or actor.get_type() == "AVATAR":
@@ -3929,6 +5006,38 @@ class DataLink(QObject):
                     if LI(): log_info(f" - character using expression drivers: {actor.use_drivers}")
             else:
                 log_error(f"Unable to find actor: {name} ({link_id})")
+        if known or missing:
+            self.send_template_hashes(known, missing)
+        if not self.data.template_pending and self.data.template_pending_frames:
+            self.replay_template_pending_frames()
+
+    def hold_template_pending_frame(self, func, data):
+        """Holds back a pose or sequence frame (and its ack) while any actor is waiting for its template,
+           so the frame is applied to every actor once the template arrives"""
+        if self.data.template_pending and self.data.template_pending_frames is not None:
+            self.data.template_pending_frames.append((func, data))
+            return True
+        return False
+
+    def replay_template_pending_frames(self):
+        frames = self.data.template_pending_frames
+        # no holding back while replaying
+        self.data.template_pending_frames = None
+        if frames and LI(): log_info(f"Applying {len(frames)} frames held for pending templates")
+        for func, data in frames or []:
+            func(data)
+        self.data.template_pending_frames = []
+
+    def receive_actor_subsets(self, template_json):
+        """Template reply from the receiver with the bone and channel indices it actually uses"""
+        for actor_data in template_json["actors"]:
+            link_id = actor_data.get("link_id")
+            actor = self.data.find_sequence_actor(link_id)
+            if actor and (actor.get_type() == "PROP" or actor.get_type() == "AVATAR"):
+                actor.set_subsets(actor_data)
+                if LI(): log_info(f"Character Subsets Received: {actor.name} "
+                                  f"bones: {len(actor.subset_bones) if actor.subset_bones is not None else 'all'} "
+                                  f"channels: { {key: len(indices) for key, indices in actor.channel_subsets.items()} }")
 
     def encode_request_data(self, actors, request_type):
         actors_data = []
@@ -3951,6 +5060,7 @@ class DataLink(QObject):
         if request_type in ["POSE", "SEQUENCE", "MOTIONS"]:
             of_types = ["AVATAR", "LIGHT", "CAMERA"]
         actors = self.get_selected_actors(of_types=of_types)
+        reset_actors(actors)
         if actors:
             self.update_link_status(f"Sending Request, waiting for response ...")
             self.send_notify(f"Request")
@@ -3977,11 +5087,20 @@ class DataLink(QObject):
         json_data = decode_to_json(data)
         request_type = json_data["type"]
         actors_data = json_data["actors"]
+        utils.start_timer("request")
+        # resolve all the requested actors against one snapshot of the scene
+        scene_index = cc.SceneIndex()
+        self.confirm_actors(actors_data, scene_index)
+        utils.log_timer(f"Request {request_type}: {len(actors_data)} actors confirmed", unit="ms", name="request")
+        self.send(OpCodes.CONFIRM, encode_from_json(json_data))
+
+    def confirm_actors(self, actors_data, scene_index: cc.SceneIndex):
         for actor_data in actors_data:
             name = actor_data["name"]
             link_id = actor_data["link_id"]
             character_type = actor_data["type"]
-            actor = LinkActor.find_actor(link_id, search_name=name, search_type=character_type)
+            actor = LinkActor.find_actor(link_id, search_name=name, search_type=character_type,
+                                         scene_index=scene_index)
             actor_data["confirm"] = actor is not None
             if LI(): log_info(f"Actor: {name} " + ("Confirmed!" if actor_data["confirm"] else "Missing!"))
             if actor:
@@ -3993,14 +5112,11 @@ class DataLink(QObject):
                 if actor_type != character_type:
                     actor_data["update_type"] = actor_type
                 if actor_type == "PROP" or actor_type == "AVATAR":
-                    skin_tree = cc.get_extended_skin_bones_tree(actor.object)
-                    skin_bones, id_tree = cc.extract_extended_skin_bones(skin_tree)
+                    skin_tree, skin_bones, id_tree = cc.get_cached_skin_bones_tree(actor.object, scene_index=scene_index)
                     actor_data["bones"] = [ b.GetName() for b in skin_bones ]
                     actor_data["ids"] = [ b.GetID() for b in skin_bones ]
                     actor_data["id_tree"] = id_tree
 
-        self.send(OpCodes.CONFIRM, encode_from_json(json_data))
-
     def receive_confirm(self, data):
         error_reset()
         json_data = decode_to_json(data)
@@ -4046,20 +5162,26 @@ class DataLink(QObject):
         RScene.ClearSelectObjects()
         # pose actors
         actors = []
+        scene_index = cc.get_scene_index()
         for actor_data in json_data["actors"]:
             name = actor_data["name"]
             character_type = actor_data["type"]
             link_id = actor_data["link_id"]
-            actor = LinkActor.find_actor(link_id, search_name=name, search_type=character_type)
+            actor = LinkActor.find_actor(link_id, search_name=name, search_type=character_type,
+                                         scene_index=scene_index)
             if actor:
                 self.prep_pose_actor(actor, start_time, end_time)
                 actors.append(actor)
         self.data.sequence_actors = actors
+        self.data.template_pending.clear()
+        self.data.template_pending_frames = []
         self.data.sequence_type = "POSE"
         # refresh actor timelines
         refresh_timeline(actors)
 
     def receive_pose_frame(self, data):
+        if self.hold_template_pending_frame(self.receive_pose_frame, data):
+            return
         pose_frame_data = self.decode_pose_frame_data(data)
         if not pose_frame_data:
             return
@@ -4112,6 +5234,7 @@ class DataLink(QObject):
         end_frame = json_data["end_frame"]
         self.data.sequence_start_frame = start_frame
         self.data.sequence_end_frame = end_frame
+        self.data.sequence_batched = json_data.get("batch_frames", False)
         num_frames = self.data.sequence_end_frame - self.data.sequence_start_frame + 1
         start_time = get_frame_time(self.data.sequence_start_frame, link_fps)
         end_time = get_frame_time(self.data.sequence_end_frame, link_fps)
@@ -4126,16 +5249,20 @@ class DataLink(QObject):
         RScene.ClearSelectObjects()
         # sequence actors
         actors = []
+        scene_index = cc.get_scene_index()
         for actor_data in json_data["actors"]:
             name = actor_data["name"]
             character_type = actor_data["type"]
             link_id = actor_data["link_id"]
-            actor = LinkActor.find_actor(link_id, search_name=name, search_type=character_type)
+            actor = LinkActor.find_actor(link_id, search_name=name, search_type=character_type,
+                                         scene_index=scene_index)
             if actor:
                 self.prep_pose_actor(actor, start_time, end_time)
                 actor.begin_editing()
                 actors.append(actor)
         self.data.sequence_actors = actors
+        self.data.template_pending.clear()
+        self.data.template_pending_frames = []
         self.data.sequence_type = "SEQUENCE"
         if not actors:
             self.send_invalid("No valid sequence Actors!")
@@ -4143,53 +5270,121 @@ class DataLink(QObject):
         refresh_timeline(actors)
         # move to end of range
         RGlobal.SetTime(get_frame_time(self.data.sequence_end_frame, link_fps))
+        # with a deferred bake, only FK keys are written while streaming
+        # and each actor is baked to IK once over the whole range at the end
+        self.data.sequence_defer_bake = options.get_opts().DATALINK_DEFER_IK_BAKE
+        utils.start_timer("sequence_apply")
+        # received frames are buffered and acknowledged immediately,
+        # then applied in time slices of each loop
+        self.data.sequence_frame_buffer = deque()
+        self.data.sequence_buffer_size = max(0, options.get_opts().DATALINK_RECEIVE_BUFFER)
+        self.data.sequence_apply_loop = -1
+        # record the received keys to simplify the curves at the end
+        self.data.sequence_simplify = None
+        self.data.sequence_recorder = simplify.KeyRecorder() if options.get_opts().DATALINK_SIMPLIFY_SEQUENCE else None
+        for actor in actors:
+            actor.key_recorder = self.data.sequence_recorder
         # start the sequence
-        self.start_sequence()
+        if self.data.sequence_buffer_size > 0:
+            self.start_sequence(func=self.apply_sequence_buffer)
+        else:
+            self.start_sequence()
         #utils.start_timer("apply_world_fk_pose")
         #utils.start_timer("try_get_pose_bone")
         #utils.start_timer("fetch_transforms")
 
     def receive_sequence_frame(self, data):
-        sequence_frame_data = self.decode_pose_frame_data(data)
-        if not sequence_frame_data:
+        if self.hold_template_pending_frame(self.receive_sequence_frame, data):
+            return
+        if self.data.sequence_batched:
+            frames_data = self.decode_sequence_batch_data(data)
+        else:
+            frames_data = [ self.decode_pose_frame_data(data) ]
+        if not frames_data or not frames_data[0]:
             return
+        frame = frames_data[-1]["frame"]
+        self.update_link_status(f"Sequence Frame: {frame} Received", log=False)
+        buffer = self.data.sequence_frame_buffer
+        if self.data.sequence_buffer_size > 0 and buffer is not None:
+            buffer.extend(frames_data)
+            # bound the buffer by applying the oldest frames now, which holds back the ack
+            if len(buffer) > self.data.sequence_buffer_size:
+                overflow = [ buffer.popleft() for i in range(len(buffer) - self.data.sequence_buffer_size) ]
+                self.apply_sequence_frames(overflow)
+        else:
+            self.apply_sequence_frames(frames_data)
+        # send sequence frame ack
+        self.send_sequence_ack(frame, len(frames_data))
+
+    def apply_sequence_buffer(self):
+        """Applies buffered sequence frames for up to SEQUENCE_APPLY_BUDGET_S, once per loop"""
+        link_service = self.get_link_service()
+        buffer = self.data.sequence_frame_buffer
+        if not buffer or not link_service:
+            return
+        if link_service.loop_count == self.data.sequence_apply_loop:
+            return
+        self.data.sequence_apply_loop = link_service.loop_count
+        end_time = time.perf_counter() + SEQUENCE_APPLY_BUDGET_S
+        frames_data = []
+        # always apply at least one frame
+        while buffer:
+            frames_data.append(buffer.popleft())
+            self.apply_sequence_frames(frames_data[-1:], set_time=False)
+            if time.perf_counter() >= end_time:
+                break
+        RGlobal.SetTime(self.data.sequence_current_frame_time)
+
+    def flush_sequence_buffer(self):
+        buffer = self.data.sequence_frame_buffer
+        if buffer:
+            self.apply_sequence_frames(list(buffer))
+            buffer.clear()
+
+    def apply_sequence_frames(self, frames_data, set_time=True):
         # clear selected objects, only if needed as this triggers UI updates
         if RScene.GetSelectedObjects():
             RScene.ClearSelectObjects()
         link_fps = self.get_link_fps()
-        frame = sequence_frame_data["frame"]
-        scene_time = get_frame_time(frame, link_fps)
-        if scene_time > RGlobal.GetEndTime():
-            RGlobal.SetEndTime(scene_time)
-        if scene_time < RGlobal.GetStartTime():
-            RGlobal.SetStartTime(scene_time)
-        self.data.sequence_current_frame_time = scene_time
-        self.data.sequence_current_frame = frame
-        self.update_link_status(f"Sequence Frame: {frame} Received", log=False)
-        # update all actor poses
-        for actor_data in sequence_frame_data["actors"]:
-            actor: LinkActor = actor_data["actor"]
-            T = actor.get_type()
-            if T == "AVATAR" or T == "PROP":
-                apply_pose(actor, scene_time, actor_data["pose"], actor_data["shapes"])
-                apply_shapes(actor, scene_time, actor_data["pose"], actor_data["shapes"])
-            elif T == "LIGHT":
-                apply_transform(actor, scene_time, actor_data["transform"])
-                apply_light(actor, scene_time, actor_data["light"])
-            elif T == "CAMERA":
-                apply_transform(actor, scene_time, actor_data["transform"])
-                apply_camera(actor, scene_time, actor_data["camera"])
-        RGlobal.SetTime(scene_time)
-        # send sequence frame ack
-        self.send_sequence_ack(frame)
-
-    def send_sequence_ack(self, frame):
+        bake_ik = not self.data.sequence_defer_bake
+        utils.mark_timer("sequence_apply")
+        for sequence_frame_data in frames_data:
+            frame = sequence_frame_data["frame"]
+            scene_time = get_frame_time(frame, link_fps)
+            if scene_time > RGlobal.GetEndTime():
+                RGlobal.SetEndTime(scene_time)
+            if scene_time < RGlobal.GetStartTime():
+                RGlobal.SetStartTime(scene_time)
+            self.data.sequence_current_frame_time = scene_time
+            self.data.sequence_current_frame = frame
+            # update all actor poses
+            for actor_data in sequence_frame_data["actors"]:
+                actor: LinkActor = actor_data["actor"]
+                T = actor.get_type()
+                if T == "AVATAR" or T == "PROP":
+                    apply_pose(actor, scene_time, actor_data["pose"], actor_data["shapes"], bake_ik=bake_ik)
+                    apply_shapes(actor, scene_time, actor_data["pose"], actor_data["shapes"], changed_only=True)
+                elif T == "LIGHT":
+                    apply_transform(actor, scene_time, actor_data["transform"])
+                    apply_light(actor, scene_time, actor_data["light"])
+                elif T == "CAMERA":
+                    apply_transform(actor, scene_time, actor_data["transform"])
+                    apply_camera(actor, scene_time, actor_data["camera"])
+        utils.update_timer("sequence_apply")
+        if set_time:
+            RGlobal.SetTime(scene_time)
+
+    def send_sequence_ack(self, frame, num_frames=1):
         link_service = self.get_link_service()
-        # encode sequence ack
-        data = encode_from_json({
-            "frame": frame,
-            "rate": link_service.loop_rate,
-        })
+        if self.data.sequence_batched:
+            # binary cumulative ack: all frames up to and including frame received
+            data = struct.pack("!IIf", frame, num_frames, link_service.loop_rate)
+        else:
+            # encode sequence ack
+            data = encode_from_json({
+                "frame": frame,
+                "rate": link_service.loop_rate,
+            })
         # send sequence ack
         self.send(OpCodes.SEQUENCE_ACK, data)
 
@@ -4200,65 +5395,129 @@ class DataLink(QObject):
         aborted = json_data.get("aborted", False)
         self.data.sequence_end_frame = frame
         num_frames = self.data.sequence_end_frame - self.data.sequence_start_frame
+        # apply the frames held back for pending templates, without the actors still missing theirs
+        if self.data.template_pending_frames:
+            if self.data.template_pending:
+                if LW(): log_warn(f"Templates never received for: {list(self.data.template_pending.keys())}")
+            self.replay_template_pending_frames()
         self.stop_sequence()
+        # apply any frames still in the receive buffer
+        self.flush_sequence_buffer()
+        self.data.sequence_frame_buffer = None
         scene_start_time = get_frame_time(self.data.sequence_start_frame, link_fps)
         scene_end_time = get_frame_time(self.data.sequence_end_frame, link_fps)
+        recorder = self.data.sequence_recorder
+        self.data.sequence_recorder = None
+        # actors that never got their template still need to finish editing
+        self.data.sequence_actors.extend(self.data.template_pending.values())
+        self.data.template_pending.clear()
+        actors = self.data.sequence_actors
+        for actor in actors:
+            actor.key_recorder = None
+        self.data.sequence_end_args = (actors, scene_start_time, scene_end_time, num_frames, aborted)
+        self.data.sequence_actors = None
+        self.data.sequence_type = None
+        # remove the redundant keys in the background, before the IK bake
+        if recorder and not aborted and any(actor.expressions for actor in actors):
+            # RLPy has no API to remove a single expression key, they are only reduced to changes while keying
+            if LI(): log_info("Expression keys are not simplified")
+        if recorder and recorder.channels and not aborted:
+            self.data.sequence_simplify = simplify.SequenceSimplify(recorder, options.get_opts().DATALINK_SIMPLIFY_TOLERANCE)
+            self.data.sequence_apply_loop = -1
+            self.update_link_status(f"Simplifying Sequence ...")
+            self.start_sequence(func=self.update_sequence_simplify)
+        else:
+            self.finish_sequence_end()
+        #utils.log_timer("apply_world_fk_pose", name="apply_world_fk_pose")
+        #utils.log_timer("try_get_pose_bone", name="try_get_pose_bone")
+        #utils.log_timer("fetch_transforms", name="fetch_transforms")
+
+    def update_sequence_simplify(self):
+        link_service = self.get_link_service()
+        sequence_simplify = self.data.sequence_simplify
+        if not sequence_simplify or not link_service:
+            return
+        if link_service.loop_count == self.data.sequence_apply_loop:
+            return
+        self.data.sequence_apply_loop = link_service.loop_count
+        if sequence_simplify.update(SEQUENCE_APPLY_BUDGET_S):
+            self.stop_sequence()
+            self.data.sequence_simplify = None
+            if LI(): log_info(f"Sequence simplified: {sequence_simplify.num_removed} of {sequence_simplify.num_keys} bone keys removed, "
+                              f"{sequence_simplify.num_restored} restored to match the interpolation")
+            self.finish_sequence_end(f"{sequence_simplify.num_removed} bone keys removed")
+
+    def finish_sequence_end(self, message=None):
+        actors, scene_start_time, scene_end_time, num_frames, aborted = self.data.sequence_end_args
+        self.data.sequence_end_args = None
         actor: LinkActor
         RScene.ClearSelectObjects()
-        for actor in self.data.sequence_actors:
-            actor.end_editing(scene_start_time)
+        utils.start_timer("sequence_bake")
+        for actor in actors:
+            actor.end_editing(scene_start_time, bake_skin_objects=self.data.sequence_defer_bake)
             RScene.SelectObject(actor.object)
-        self.data.sequence_actors = None
-        self.data.sequence_type = None
+        utils.update_timer("sequence_bake")
+        utils.log_timer(f"Sequence frames applied ({'deferred' if self.data.sequence_defer_bake else 'per frame'} IK bake)",
+                        unit="ms", name="sequence_apply")
+        utils.log_timer("Sequence IK bake", unit="ms", name="sequence_bake")
         if not aborted:
-            self.update_link_status(f"Sequence Complete: {num_frames} frames")
+            self.update_link_status(f"Sequence Complete: {num_frames} frames{', ' + message if message else ''}")
             RGlobal.Play(scene_start_time, scene_end_time)
         else:
             self.update_link_status(f"Sequence Aborted!")
-        #utils.log_timer("apply_world_fk_pose", name="apply_world_fk_pose")
-        #utils.log_timer("try_get_pose_bone", name="try_get_pose_bone")
-        #utils.log_timer("fetch_transforms", name="fetch_transforms")
 
     def receive_sequence_ack(self, data):
         OPTS = options.get_opts()
 
-        json_data = decode_to_json(data)
-        ack_frame = json_data["frame"]
-        server_rate = json_data["rate"]
+        if self.data.sequence_batched:
+            ack_frame, ack_count, server_rate = struct.unpack_from("!IIf", data)
+            if not self.check_sequence_batch_ack(ack_frame, ack_count):
+                return
+        else:
+            json_data = decode_to_json(data)
+            ack_frame = json_data["frame"]
+            server_rate = json_data["rate"]
+        window = self.data.sequence_window
+        # acks of frames beyond the last sent were for batches sent before a resend
+        if not window or ack_frame > window.sent_frame:
+            return
+        window.on_ack(ack_frame)
         delta_frames = self.data.sequence_current_frame - ack_frame
         if OPTS.MATCH_CLIENT_RATE:
-            if self.data.ack_time == 0.0:
-                self.data.ack_time = time.time()
-                self.data.ack_rate = 120
-                rate = 120
-                count = 4
-            else:
-                t = time.time()
-                delta_time = max(t - self.data.ack_time, 1/120)
-                self.data.ack_time = t
-                ack_rate = (1.0 / delta_time)
-                self.data.ack_rate = utils.lerp(self.data.ack_rate, ack_rate, 0.25)
-
-                if delta_frames > 30:
-                    rate = 5
-                    count = 1
-                elif delta_frames > 20:
-                    rate = 15
-                    count = 1
-                elif delta_frames > 10:
-                    rate = 30
-                    count = 1
-                elif delta_frames > 5:
-                    rate = 60
-                    count = 2
-                else:
-                    rate = 120
-                    count = 4
-
-            self.update_sequence(rate, count, delta_frames)
+            # the window limits the frames in flight, so send as many as it allows each loop
+            count = max(1, min(MAX_SEND_COUNT, window.available()))
+            self.update_sequence(120, count, delta_frames)
         else:
             self.update_sequence(120, 4, delta_frames)
 
+    def check_sequence_batch_ack(self, ack_frame, ack_count):
+        """Returns False, and resends the batch, if the receiver got a different number of frames"""
+        batch_sizes = self.data.sequence_batch_sizes
+        if not batch_sizes:
+            return True
+        batch_size = batch_sizes.pop(ack_frame, None)
+        # acks are cumulative, older batches are acknowledged too
+        for frame in [ frame for frame in batch_sizes if frame < ack_frame ]:
+            batch_sizes.pop(frame)
+        if batch_size is None or ack_count == batch_size:
+            return True
+        if LW(): log_warn(f"Sequence batch ack mismatch at frame {ack_frame}: {ack_count} of {batch_size} frames received")
+        self.resend_sequence_from(ack_frame - batch_size + 1)
+        return False
+
+    def resend_sequence_from(self, frame):
+        """Rewinds the sending sequence and its window to frame, the frames after it are sent again"""
+        window = self.data.sequence_window
+        if not self.data.sequence_active or not self.data.sequence_actors or not window:
+            if LW(): log_warn(f"Sequence already sent, frames from {frame} can't be resent")
+            return
+        window.reset(frame, window.window)
+        for sent_frame in [ sent_frame for sent_frame in self.data.sequence_batch_sizes if sent_frame >= frame ]:
+            self.data.sequence_batch_sizes.pop(sent_frame)
+        self.data.sequence_current_frame = frame
+        if not self.data.sequence_baked:
+            self.data.sequence_current_frame_time = get_frame_time(frame, self.get_link_fps())
+
     def receive_character_import(self,data):
         json_data = decode_to_json(data)
         fbx_path = json_data["path"]
@@ -26,6 +26,12 @@ class Options():
     AUTO_START_SERVICE: bool = False
     MATCH_CLIENT_RATE: bool = True
     DATALINK_FRAME_SYNC: bool = False
+    DATALINK_BATCH_FRAMES: bool = False
+    DATALINK_PREBAKE_SEQUENCE: bool = False
+    DATALINK_DEFER_IK_BAKE: bool = True
+    DATALINK_RECEIVE_BUFFER: int = 60
+    DATALINK_SIMPLIFY_SEQUENCE: bool = False
+    DATALINK_SIMPLIFY_TOLERANCE: float = 0.001
     CC_USE_FACIAL_PROFILE: bool = True
     CC_USE_HIK_PROFILE: bool = True
     CC_USE_FACIAL_EXPRESSIONS: bool = True
@@ -114,6 +120,12 @@ class Options():
                 self.AUTO_START_SERVICE = get_attr(temp_state_json, "auto_start_service", False)
                 self.MATCH_CLIENT_RATE = get_attr(temp_state_json, "match_client_rate", True)
                 self.DATALINK_FRAME_SYNC = get_attr(temp_state_json, "datalink_frame_sync", False)
+                self.DATALINK_BATCH_FRAMES = get_attr(temp_state_json, "datalink_batch_frames", False)
+                self.DATALINK_PREBAKE_SEQUENCE = get_attr(temp_state_json, "datalink_prebake_sequence", False)
+                self.DATALINK_DEFER_IK_BAKE = get_attr(temp_state_json, "datalink_defer_ik_bake", True)
+                self.DATALINK_RECEIVE_BUFFER = get_attr(temp_state_json, "datalink_receive_buffer", 60)
+                self.DATALINK_SIMPLIFY_SEQUENCE = get_attr(temp_state_json, "datalink_simplify_sequence", False)
+                self.DATALINK_SIMPLIFY_TOLERANCE = get_attr(temp_state_json, "datalink_simplify_tolerance", 0.001)
                 self.CC_USE_FACIAL_PROFILE = get_attr(temp_state_json, "cc_use_facial_profile", True)
                 self.CC_USE_HIK_PROFILE = get_attr(temp_state_json, "cc_use_hik_profile", True)
                 self.CC_USE_FACIAL_EXPRESSIONS = get_attr(temp_state_json, "cc_use_facial_expressions", True)
@@ -159,6 +171,12 @@ class Options():
             "auto_start_service": self.AUTO_START_SERVICE,
             "match_client_rate": self.MATCH_CLIENT_RATE,
             "datalink_frame_sync": self.DATALINK_FRAME_SYNC,
+            "datalink_batch_frames": self.DATALINK_BATCH_FRAMES,
+            "datalink_prebake_sequence": self.DATALINK_PREBAKE_SEQUENCE,
+            "datalink_defer_ik_bake": self.DATALINK_DEFER_IK_BAKE,
+            "datalink_receive_buffer": self.DATALINK_RECEIVE_BUFFER,
+            "datalink_simplify_sequence": self.DATALINK_SIMPLIFY_SEQUENCE,
+            "datalink_simplify_tolerance": self.DATALINK_SIMPLIFY_TOLERANCE,
             "cc_use_facial_profile": self.CC_USE_FACIAL_PROFILE,
             "cc_use_hik_profile": self.CC_USE_HIK_PROFILE,
             "cc_use_facial_expressions": self.CC_USE_FACIAL_EXPRESSIONS,
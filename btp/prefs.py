@@ -57,9 +57,9 @@ class Preferences(QObject):
         OPTS = options.get_opts()
 
         W = 500
-        H = 540
+        H = 680
         if cc.is_cc():
-            H = 580
+            H = 720
         self.window, layout = qt.window(f"Blender Pipeline Plug-in Preferences",
                                         width=W, height=H, fixed=True,
                                         show_hide=self.on_show_hide)
@@ -89,6 +89,21 @@ class Preferences(QObject):
         qt.DCheckBox(self, col, "Auto-start Link Server", OPTS, "AUTO_START_SERVICE", update=self.write_options)
         qt.DCheckBox(self, col, "Match Client Rate", OPTS, "MATCH_CLIENT_RATE", update=self.write_options)
         qt.DCheckBox(self, col, "Sequence Frame Sync", OPTS, "DATALINK_FRAME_SYNC", update=self.write_options)
+        qt.DCheckBox(self, col, "Batch Sequence Frames", OPTS, "DATALINK_BATCH_FRAMES", update=self.write_options)
+        qt.DCheckBox(self, col, "Pre-bake Sequences", OPTS, "DATALINK_PREBAKE_SEQUENCE", update=self.write_options)
+        qt.DCheckBox(self, col, "Defer Sequence IK Bake", OPTS, "DATALINK_DEFER_IK_BAKE", update=self.write_options)
+        qt.DCheckBox(self, col, "Simplify Received Sequences", OPTS, "DATALINK_SIMPLIFY_SEQUENCE", update=self.write_options)
+        grid = qt.grid(layout)
+        grid.setColumnStretch(1, 2)
+        qt.label(grid, "Receive Frame Buffer:", style=qt.STYLE_NONE, row=0, col=0)
+        qt.DComboBox(self, grid, OPTS, "DATALINK_RECEIVE_BUFFER",
+                           options=[(0, "Off"), (30, "30 frames"), (60, "60 frames"), (120, "120 frames"), (240, "240 frames")],
+                           numeric=True, min=0, max=1000, suffix="frames",
+                           row=0, col=1, update=self.write_options)
+        qt.label(grid, "Simplify Tolerance:", style=qt.STYLE_NONE, row=1, col=0)
+        qt.DComboBox(self, grid, OPTS, "DATALINK_SIMPLIFY_TOLERANCE",
+                           options=[(0.0001, "Fine (0.0001)"), (0.001, "Normal (0.001)"), (0.01, "Coarse (0.01)")],
+                           row=1, col=1, update=self.write_options)
 
         qt.spacing(layout, 10)
         qt.separator(layout, 1)
@@ -0,0 +1,140 @@
+# Copyright (C) 2023 Victor Soupday
+# This file is part of CC/iC-Blender-Pipeline-Plugin <https://github.com/soupday/CCiC-Blender-Pipeline-Plugin>
+#
+# CC/iC-Blender-Pipeline-Plugin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CC/iC-Blender-Pipeline-Plugin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CC/iC-Blender-Pipeline-Plugin.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+
+
+def simplify_curve(frames, values, tolerance):
+    """Indices of the keys that linear interpolation between the remaining keys reproduces
+       within tolerance (Ramer-Douglas-Peucker on the value error). The end keys are always kept."""
+    count = len(frames)
+    if count < 3:
+        return []
+    keep = [ False ] * count
+    keep[0] = keep[-1] = True
+    stack = [ (0, count - 1) ]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        fa = frames[a]
+        va = values[a]
+        df = frames[b] - fa
+        slope = (values[b] - va) / df if df else 0.0
+        max_error = -1.0
+        max_index = -1
+        for i in range(a + 1, b):
+            error = abs(values[i] - (va + slope * (frames[i] - fa)))
+            if error > max_error:
+                max_error = error
+                max_index = i
+        if max_error > tolerance:
+            keep[max_index] = True
+            stack.append((a, max_index))
+            stack.append((max_index, b))
+    return [ i for i in range(0, count) if not keep[i] ]
+
+
+# tolerance multiplier per channel kind, the base tolerance is in radians:
+# 0.001 rad is 0.1 cm of arc at a 1 m reach, so translations (cm) scale by 100.
+CHANNEL_TOLERANCE_SCALE = {
+    "rotation": 1.0,
+    "translation": 100.0,
+    "scale": 1.0,
+}
+
+# passes of re-checking the removed keys against the control's own interpolation
+MAX_VERIFY_PASSES = 4
+
+
+class KeyRecorder():
+    """Records the keys written to each animation float control while receiving a sequence,
+       so redundant keys can be found without reading them back from the controls.
+
+       channels: { key: [ control, kind, times, frames, values ] }
+       kind is one of CHANNEL_TOLERANCE_SCALE."""
+    channels: dict = None
+
+    def __init__(self):
+        self.channels = {}
+
+    def record(self, key, control, kind, time, frame, value):
+        channel = self.channels.get(key)
+        if channel is None:
+            channel = [ control, kind, [], [], [] ]
+            self.channels[key] = channel
+        channel[2].append(time)
+        channel[3].append(frame)
+        channel[4].append(value)
+
+
+def get_control_value(control, time):
+    return control.GetValue(time, 0.0)[1]
+
+
+class SequenceSimplify():
+    """Removes the redundant recorded keys in time budgeted slices.
+
+       The curve fit assumes linear interpolation, so each removed key is checked against
+       the value the control actually evaluates to and restored if it is out of tolerance."""
+    recorder: KeyRecorder = None
+    tolerance: float = 0.001
+    queue: list = None
+    num_keys: int = 0
+    num_removed: int = 0
+    num_restored: int = 0
+    done: bool = False
+
+    def __init__(self, recorder: KeyRecorder, tolerance):
+        self.recorder = recorder
+        self.tolerance = tolerance
+        self.queue = list(recorder.channels.values())
+        self.num_keys = 0
+        self.num_removed = 0
+        self.num_restored = 0
+        self.done = not self.queue
+
+    def simplify_channel(self, control, kind, times, frames, values):
+        tolerance = self.tolerance * CHANNEL_TOLERANCE_SCALE[kind]
+        removed = simplify_curve(frames, values, tolerance)
+        for i in removed:
+            control.RemoveKey(times[i])
+        passes = 0
+        while removed and passes < MAX_VERIFY_PASSES:
+            # restoring a key can shift the curve around it, so re-check the rest
+            passes += 1
+            remaining = []
+            for i in removed:
+                if abs(get_control_value(control, times[i]) - values[i]) > tolerance:
+                    control.SetValue(times[i], values[i])
+                    self.num_restored += 1
+                else:
+                    remaining.append(i)
+            if len(remaining) == len(removed):
+                break
+            removed = remaining
+        self.num_keys += len(times)
+        self.num_removed += len(removed)
+
+    def update(self, budget_s):
+        """Simplifies channels until the time budget runs out, returns True when all done"""
+        end_time = time.perf_counter() + budget_s
+        while self.queue:
+            self.simplify_channel(*self.queue.pop())
+            if time.perf_counter() >= end_time:
+                break
+        self.done = not self.queue
+        return self.done
@@ -14,9 +14,10 @@
 # You should have received a copy of the GNU General Public License
 # along with CC/iC-Blender-Pipeline-Plugin.  If not, see <https://www.gnu.org/licenses/>.
 
-import os, json, RLPy
+import os, json, time, math, random, struct, tracemalloc, RLPy
+from array import array
 from RLPy import *
-from . import vars, utils, cc
+from . import vars, utils, cc, flow, kinematics
 
 
 BONES = []
@@ -511,5 +512,706 @@ def prop_clip_test():
         clip.SetLength(RGlobal.GetEndTime())
         RGlobal.ObjectModified(obj, EObjectModifiedType_Motion)
 
+def bucket_sequence_rate(delta_frames):
+    """The previous sequence flow control: fixed loop rate and frames per loop by frames in flight"""
+    if delta_frames > 30:
+        return 5, 1
+    elif delta_frames > 20:
+        return 15, 1
+    elif delta_frames > 10:
+        return 30, 1
+    elif delta_frames > 5:
+        return 60, 2
+    else:
+        return 120, 4
+
+
+def simulate_sequence(use_window, num_frames=600, latency=0.02, process_time=1/90):
+    """Streams num_frames to a simulated receiver that applies one frame every process_time
+       seconds over a link with the given one way latency, returns (duration, max frames in flight)"""
+    window = flow.SequenceWindow(0) if use_window else None
+    acks = []
+    ack_index = 0
+    ack_frame = -1
+    next_frame = 0
+    receiver_free = 0.0
+    rate, count = 120, 4
+    max_in_flight = 0
+    t = 0.0
+    while ack_frame < num_frames - 1:
+        # receive acks
+        while ack_index < len(acks) and acks[ack_index][0] <= t:
+            ack_time, ack_frame = acks[ack_index]
+            ack_index += 1
+            if window:
+                window.on_ack(ack_frame, ack_time)
+                rate, count = 120, max(1, min(8, window.available()))
+            else:
+                rate, count = bucket_sequence_rate(next_frame - 1 - ack_frame)
+        # send frames
+        for i in range(0, count):
+            if next_frame >= num_frames:
+                break
+            if window and not window.can_send():
+                break
+            start = max(t + latency, receiver_free)
+            receiver_free = start + process_time
+            acks.append((receiver_free + latency, next_frame))
+            if window:
+                window.on_send(next_frame, t)
+            next_frame += 1
+        max_in_flight = max(max_in_flight, next_frame - 1 - ack_frame)
+        t += 1 / rate
+    return t, max_in_flight
+
+
+def flow_benchmark():
+    for latency in [0.001, 0.01, 0.05]:
+        for process_time in [1/240, 1/90, 1/30]:
+            for use_window in [False, True]:
+                duration, max_in_flight = simulate_sequence(use_window, latency=latency, process_time=process_time)
+                name = "window" if use_window else "bucket"
+                print(f"{name}: latency {latency*1000:.0f}ms, receiver {1/process_time:.0f} fps: "
+                      f"{600/duration:.1f} fps, max in flight {max_in_flight}")
+
+
+class StubNode():
+    def __init__(self, name, id):
+        self.name = name
+        self.id = id
+
+    def GetName(self):
+        return self.name
+
+    def GetID(self):
+        return self.id
+
+
+class StubClip():
+    def GetControl(self, control_type, bone):
+        return None
+
+
+class StubVariant():
+    def __init__(self, value):
+        self.value = value
+
+    def ToString(self):
+        return self.value
+
+
+class StubAttribute():
+    def __init__(self, name):
+        self.name = name
+
+    def GetName(self):
+        return self.name
+
+
+class StubDataBlock():
+    def __init__(self, data):
+        self.data = data
+
+    def GetAttributes(self):
+        return [ StubAttribute(name) for name in self.data ]
+
+    def GetData(self, name):
+        return StubVariant(self.data[name])
+
+
+class StubSceneObject(StubNode):
+    def __init__(self, name, id, link_id):
+        super().__init__(name, id)
+        self.data_blocks = { "DataLink": StubDataBlock({ "LinkID": link_id, "LinkIDName": name }) }
+
+    def GetDataBlock(self, block_name):
+        return self.data_blocks.get(block_name)
+
+
+class StubScene():
+    def __init__(self, objects):
+        self.objects = objects
+
+    def FindObjects(self, object_types):
+        return list(self.objects)
+
+    def FindChildObjects(self, obj, object_types):
+        # children are not linked in the stub scene, so scan for them as the real scene would
+        return [ o for o in self.objects if getattr(o, "parent", None) is obj ]
+
+
+def link_id_index_benchmark(num_objects=5000, num_lookups=100):
+    """Compares the link metadata reads and link_id lookups through the caches
+       against reading the data blocks and scanning the objects of a stub scene"""
+    objects = [ StubSceneObject(f"Object_{i}", f"ID_{i}", f"LINK_{i}") for i in range(0, num_objects) ]
+    rnd = random.Random(0)
+    link_ids = [ f"LINK_{rnd.randrange(0, num_objects)}" for i in range(0, num_lookups) ]
+    scene = cc.RScene
+    cc.RScene = StubScene(objects)
+    cc.LINK_META_CACHE.clear()
+    try:
+        t = time.perf_counter()
+        for obj in objects:
+            cc.get_data_block_str(obj, "DataLink", "LinkID")
+            cc.get_data_block_str(obj, "DataLink", "LinkIDName")
+        data_block_time = time.perf_counter() - t
+        t = time.perf_counter()
+        for obj in objects:
+            cc.get_link_meta(obj)
+        meta_miss_time = time.perf_counter() - t
+        t = time.perf_counter()
+        for obj in objects:
+            cc.get_link_meta(obj)
+        meta_time = time.perf_counter() - t
+        t = time.perf_counter()
+        for link_id in link_ids:
+            for obj in cc.RScene.FindObjects(0):
+                if cc.get_link_id(obj) == link_id:
+                    break
+        scan_time = time.perf_counter() - t
+        cc.invalidate_scene_index()
+        t = time.perf_counter()
+        cc.get_scene_index()
+        build_time = time.perf_counter() - t
+        t = time.perf_counter()
+        for link_id in link_ids:
+            cc.find_object_by_link_id(link_id)
+        index_time = time.perf_counter() - t
+    finally:
+        cc.RScene = scene
+        cc.invalidate_scene_index()
+        cc.LINK_META_CACHE.clear()
+    print(f"{num_objects} objects, link metadata: data block: {data_block_time*1000:.1f}ms, "
+          f"cached: {meta_time*1000:.1f}ms (first read: {meta_miss_time*1000:.1f}ms)")
+    print(f"{num_objects} objects, {num_lookups} lookups: scan (cached metadata): {scan_time*1000:.1f}ms, "
+          f"index: {index_time*1000:.2f}ms (+ {build_time*1000:.1f}ms build)")
+
+
+class StubProp(StubSceneObject):
+    pass
+
+
+class StubLight(StubSceneObject):
+    pass
+
+
+def scan_object_by_name_and_type(search_name, search_type=None):
+    """The full scene scan, as find_object_by_name_and_type did before the scene index"""
+    for obj in cc.RScene.FindObjects(0):
+        if obj.GetName() == search_name:
+            if search_type:
+                if cc.get_object_type(obj) == search_type:
+                    return obj
+            else:
+                return obj
+
+
+def scene_index_benchmark(num_props=500, num_lights=200, num_lookups=500):
+    """Compares name and type lookups, deduplication and de-duplicated selection
+       through the scene index against scanning the objects of a stub scene of props and lights"""
+    rnd = random.Random(0)
+    objects = []
+    for i in range(0, num_props):
+        objects.append(StubProp(f"Prop_{i}", f"PROP_{i}", f"LINK_PROP_{i}"))
+    for i in range(0, num_lights):
+        objects.append(StubLight(f"Light_{i}", f"LIGHT_{i}", f"LINK_LIGHT_{i}"))
+    lookups = []
+    for i in range(0, num_lookups):
+        if rnd.random() < 0.5:
+            lookups.append((f"Prop_{rnd.randrange(0, num_props)}", "PROP"))
+        else:
+            lookups.append((f"Light_{rnd.randrange(0, num_lights)}", "LIGHT"))
+    selected = [ rnd.choice(objects) for i in range(0, num_lookups) ]
+    scene, ri_prop, ri_light = cc.RScene, cc.RIProp, cc.RILight
+    cc.RScene = StubScene(objects)
+    cc.RIProp = StubProp
+    cc.RILight = StubLight
+    cc.LINK_META_CACHE.clear()
+    try:
+        t = time.perf_counter()
+        for name, T in lookups:
+            assert scan_object_by_name_and_type(name, T)
+        scan_time = time.perf_counter() - t
+        t = time.perf_counter()
+        scene_index = cc.SceneIndex()
+        build_time = time.perf_counter() - t
+        t = time.perf_counter()
+        for name, T in lookups:
+            assert cc.find_object_by_name_and_type(name, T, scene_index=scene_index)
+        index_time = time.perf_counter() - t
+        t = time.perf_counter()
+        done = []
+        for obj in selected:
+            if obj.GetID() not in done:
+                done.append(obj.GetID())
+        list_time = time.perf_counter() - t
+        t = time.perf_counter()
+        done = set()
+        for obj in selected:
+            if obj.GetID() not in done:
+                done.add(obj.GetID())
+        set_time = time.perf_counter() - t
+    finally:
+        cc.RScene, cc.RIProp, cc.RILight = scene, ri_prop, ri_light
+        cc.invalidate_scene_index()
+        cc.LINK_META_CACHE.clear()
+    print(f"{num_props} props, {num_lights} lights, {num_lookups} name/type lookups: "
+          f"scan: {scan_time*1000:.1f}ms, index: {index_time*1000:.2f}ms (+ {build_time*1000:.1f}ms build)")
+    print(f"{num_lookups} selected objects de-duplicated: list: {list_time*1000:.2f}ms, set: {set_time*1000:.2f}ms")
+
+
+class StubBone(StubNode):
+    def __init__(self, name, id, parent):
+        super().__init__(name, id)
+        self.parent = parent
+
+    def GetParent(self):
+        return self.parent
+
+
+class StubSkeleton():
+    def __init__(self, bones):
+        self.bones = bones
+
+    def GetRootBone(self):
+        return self.bones[0]
+
+    def GetSkinBones(self):
+        return self.bones
+
+
+class StubRigProp(StubProp):
+    def __init__(self, name, id, link_id, num_bones):
+        super().__init__(name, id, link_id)
+        bones = []
+        for i in range(0, num_bones):
+            bones.append(StubBone(f"{name}_Bone_{i}", f"{id}_BONE_{i}", bones[(i - 1) // 2] if i else None))
+        self.skeleton = StubSkeleton(bones)
+
+    def GetSkeletonComponent(self):
+        return self.skeleton
+
+
+def request_benchmark(actor_counts=[10, 50, 100, 200], num_lights=200, num_bones=20):
+    """Request latency vs. the number of requested actors in a stub scene of rigged props and lights,
+       finding each actor with a scan of the scene (as before) vs. resolving all of them against one scene snapshot"""
+    from . import link
+    data_link = link.get_data_link()
+    max_actors = max(actor_counts)
+    objects = [ StubRigProp(f"Prop_{i}", f"PROP_{i}", f"LINK_PROP_{i}", num_bones) for i in range(0, max_actors) ]
+    objects.extend([ StubLight(f"Light_{i}", f"LIGHT_{i}", f"LINK_LIGHT_{i}") for i in range(0, num_lights) ])
+    scene, ri_prop, ri_light = cc.RScene, cc.RIProp, cc.RILight
+    cc.RScene = StubScene(objects)
+    cc.RIProp = StubRigProp
+    cc.RILight = StubLight
+    cc.LINK_META_CACHE.clear()
+    try:
+        for num_actors in actor_counts:
+            actors_data = [ { "name": f"Prop_{i}", "link_id": f"LINK_PROP_{i}", "type": "PROP" }
+                            for i in range(0, num_actors) ]
+            cc.SKIN_TREE_CACHE.clear()
+            t = time.perf_counter()
+            for actor_data in actors_data:
+                data_link.confirm_actors([actor_data], cc.SceneIndex())
+            scan_time = time.perf_counter() - t
+            cc.SKIN_TREE_CACHE.clear()
+            t = time.perf_counter()
+            data_link.confirm_actors(actors_data, cc.SceneIndex())
+            snapshot_time = time.perf_counter() - t
+            print(f"{num_actors} actors ({len(objects)} scene objects): "
+                  f"scan per actor: {scan_time*1000:.1f}ms, snapshot: {snapshot_time*1000:.1f}ms")
+    finally:
+        cc.RScene, cc.RIProp, cc.RILight = scene, ri_prop, ri_light
+        cc.invalidate_scene_index()
+        cc.LINK_META_CACHE.clear()
+        cc.SKIN_TREE_CACHE.clear()
+
+
+def skin_tree_cache_benchmark(num_props=50, num_bones=200, num_passes=4):
+    """Fetches the skin bone trees of the rigged props of a stub scene, as each sync operation
+       (template, request, pose, export) does, walking the skeletons every time vs. through the cache"""
+    objects = [ StubRigProp(f"Prop_{i}", f"PROP_{i}", f"LINK_PROP_{i}", num_bones) for i in range(0, num_props) ]
+    scene, ri_prop = cc.RScene, cc.RIProp
+    cc.RScene = StubScene(objects)
+    cc.RIProp = StubRigProp
+    cc.LINK_META_CACHE.clear()
+    cc.SKIN_TREE_CACHE.clear()
+    try:
+        t = time.perf_counter()
+        for i in range(0, num_passes):
+            for obj in objects:
+                skin_tree = cc.get_extended_skin_bones_tree(obj)
+                skin_bones, id_tree = cc.extract_extended_skin_bones(skin_tree)
+        walk_time = time.perf_counter() - t
+        t = time.perf_counter()
+        for i in range(0, num_passes):
+            for obj in objects:
+                skin_tree, skin_bones, id_tree = cc.get_cached_skin_bones_tree(obj)
+        cached_time = time.perf_counter() - t
+    finally:
+        cc.RScene, cc.RIProp = scene, ri_prop
+        cc.LINK_META_CACHE.clear()
+        cc.SKIN_TREE_CACHE.clear()
+    print(f"{num_props} props x {num_bones} bones, {num_passes} passes: "
+          f"walked: {walk_time*1000:.1f}ms, cached: {cached_time*1000:.1f}ms")
+
+
+def expression_rotation_benchmark():
+    """Times the expression bone rotation scan of the first avatar against the cached table"""
+    avatar = cc.get_first_avatar()
+    FC = avatar.GetFaceComponent() if avatar else None
+    SC = cc.safe_get_skeleton_component(avatar) if avatar else None
+    if not FC or not SC:
+        return
+    expressions = FC.GetExpressionNames("")
+    bones = SC.GetSkinBones()
+    t = time.perf_counter()
+    table = cc.scan_expression_bone_rotations(FC, expressions, bones)
+    scan_time = time.perf_counter() - t
+    cc.get_expression_bone_rotations(avatar)
+    t = time.perf_counter()
+    cached = cc.get_expression_bone_rotations(avatar)
+    cached_time = time.perf_counter() - t
+    assert cached == table
+    print(f"{len(expressions)} expressions x {len(bones)} bones: "
+          f"scan: {scan_time*1000:.1f}ms, cached: {cached_time*1000:.2f}ms")
+
+
+def make_stub_light_data(link_id, rnd: random.Random):
+    """Light data as get_light_data returns it, with random animated values"""
+    return {
+        "link_id": link_id,
+        "name": link_id,
+        "loc": [rnd.random(), rnd.random(), rnd.random()],
+        "rot": [rnd.random(), rnd.random(), rnd.random(), rnd.random()],
+        "sca": [1.0, 1.0, 1.0],
+        "active": rnd.random() > 0.5,
+        "color": [rnd.random(), rnd.random(), rnd.random()],
+        "multiplier": rnd.random(),
+        "type": "SPOT",
+        "range": 1000.0,
+        "angle": rnd.random() * 90,
+        "falloff": 100.0,
+        "attenuation": 100.0,
+        "inverse_square": False,
+        "transmission": False,
+        "is_tube": False,
+        "tube_length": 0.0,
+        "tube_radius": 0.0,
+        "tube_soft_radius": 0.0,
+        "is_rectangle": False,
+        "rect": [0.0, 0.0],
+        "cast_shadow": True,
+        "darkness": 0.0,
+    }
+
+
+def pack_light_frame_rows(all_data, light_index):
+    """The .rlx light frames packed one frame dict at a time, as export_light did before the columns"""
+    frames_bytes = bytearray()
+    for frame_data in all_data:
+        light_data = frame_data["lights"][light_index]
+        frames_bytes.extend(struct.pack("!II?fffffffffffffffffff",
+                                        frame_data["time"], frame_data["frame"], light_data["active"],
+                                        *light_data["loc"], *light_data["rot"], *light_data["sca"], *light_data["color"],
+                                        light_data["multiplier"], light_data["range"], light_data["angle"],
+                                        light_data["falloff"], light_data["attenuation"], light_data["darkness"]))
+    return bytes(frames_bytes)
+
+
+def light_timeline_benchmark(num_frames=10000, num_lights=36):
+    """Memory and time of storing and packing a timeline of stub light data as a list of per frame dicts
+       (as before) vs. as typed columns per light, checking both pack the same .rlx frame bytes"""
+    from . import exporter
+    link_ids = [ f"LIGHT_{i}" for i in range(0, num_lights) ]
+    # rows
+    rnd = random.Random(0)
+    tracemalloc.start()
+    t = time.perf_counter()
+    all_rows = []
+    for frame in range(0, num_frames):
+        all_rows.append({
+            "time": frame * 100,
+            "frame": frame,
+            "lights": [ make_stub_light_data(link_id, rnd) for link_id in link_ids ],
+            "cameras": [],
+        })
+    rows_store_time = time.perf_counter() - t
+    rows_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    t = time.perf_counter()
+    rows_bytes = [ pack_light_frame_rows(all_rows, i) for i in range(0, num_lights) ]
+    rows_pack_time = time.perf_counter() - t
+    all_rows = None
+    # columns
+    rnd = random.Random(0)
+    tracemalloc.start()
+    t = time.perf_counter()
+    all_columns = { "times": array("q"), "frames": array("q"), "lights": {}, "cameras": {} }
+    for link_id in link_ids:
+        all_columns["lights"][link_id] = cc.new_timeline_object({ "link_id": link_id }, cc.LIGHT_FRAME_COLUMNS)
+    for frame in range(0, num_frames):
+        all_columns["times"].append(frame * 100)
+        all_columns["frames"].append(frame)
+        for link_id in link_ids:
+            cc.add_timeline_frame(all_columns["lights"][link_id], cc.LIGHT_FRAME_COLUMNS,
+                                  make_stub_light_data(link_id, rnd), first=frame == 0)
+    columns_store_time = time.perf_counter() - t
+    columns_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    t = time.perf_counter()
+    columns_bytes = [ exporter.pack_frame_columns(all_columns["times"], all_columns["frames"],
+                                                  all_columns["lights"][link_id]["columns"], cc.LIGHT_FRAME_COLUMNS)
+                      for link_id in link_ids ]
+    columns_pack_time = time.perf_counter() - t
+    assert columns_bytes == rows_bytes
+    print(f"{num_lights} lights x {num_frames} frames, frame dicts: {rows_memory/1048576:.1f}MB, "
+          f"store {rows_store_time*1000:.0f}ms, pack {rows_pack_time*1000:.0f}ms")
+    print(f"{num_lights} lights x {num_frames} frames, columns: {columns_memory/1048576:.1f}MB, "
+          f"store {columns_store_time*1000:.0f}ms, pack {columns_pack_time*1000:.0f}ms")
+
+
+def sample_actors_benchmark(num_frames=100):
+    """Samples the selected actors for num_frames, re-resolving the actor types, components and
+       channel names every frame (as before they were cached on the LinkActor) vs. resolving them once"""
+    from . import link
+    data_link = link.get_data_link()
+    actors = data_link.get_selected_actors(of_types=["AVATAR", "PROP", "LIGHT", "CAMERA"])
+    if not actors:
+        return
+    link_fps = link.get_local_fps()
+    for actor in actors:
+        if actor.get_type() in ["AVATAR", "PROP"]:
+            actor.skin_tree = cc.get_extended_skin_bones_tree(actor.object)
+            actor.skin_bones, actor.id_tree = cc.extract_extended_skin_bones(actor.skin_tree)
+    for resolve_every_frame in [True, False]:
+        t = time.perf_counter()
+        for frame in range(0, num_frames):
+            for actor in actors:
+                if resolve_every_frame:
+                    actor.invalidate()
+                data_link.sample_actor_frame(actor, link_fps, frame)
+        duration = time.perf_counter() - t
+        name = "resolved per frame" if resolve_every_frame else "resolved once"
+        print(f"{len(actors)} actors, {num_frames} frames, {name}: {duration*1000/num_frames:.3f}ms per frame")
+
+
+def make_stub_rig_actor(num_bones=150, seed=0):
+    """A LinkActor with a random skin bone tree of stub bones, with a stub clip that takes no keys,
+       for benchmarking the pose solve without a character in the scene"""
+    from . import link
+    rnd = random.Random(seed)
+    obj = StubNode("Rig", "RIG")
+    actor = link.LinkActor.__new__(link.LinkActor)
+    actor.name = "Rig"
+    actor.object = obj
+    actor.invalidate()
+    actor.reset()
+    actor.skin_objects = { obj.GetID(): { "object": obj, "SC": True, "clip": StubClip(), "clip_time": RTime.FromValue(0) } }
+    actor.t_pose = {}
+    defs = []
+    pose_data = []
+    for i in range(0, num_bones):
+        name = f"Bone_{i}_Twist" if i % 10 == 5 else f"Bone_{i}"
+        bone = StubNode(name, f"ID_{i}")
+        bone_def = { "bone": bone, "object": obj, "children": [] }
+        if defs:
+            defs[rnd.randrange(0, len(defs))]["children"].append(bone_def)
+        defs.append(bone_def)
+        actor.t_pose[bone.GetID()] = [rnd.random(), rnd.random(), rnd.random(), 0, 0, 0, 1, 1, 1, 1]
+        # leave some bones out of the pose
+        if i % 7:
+            actor.bone_ids.append(bone.GetID())
+            q = [ rnd.random() - 0.5 for j in range(0, 4) ]
+            l = math.sqrt(sum(v*v for v in q))
+            pose_data.append([rnd.random(), rnd.random(), rnd.random(), q[0]/l, q[1]/l, q[2]/l, q[3]/l, 1, 1, 1])
+    actor.skin_tree = defs[0]
+    actor.retarget_plan = None
+    return actor, pose_data
+
+
+def retarget_benchmark(num_bones=150, num_frames=100):
+    from . import link
+    actor, pose_data = make_stub_rig_actor(num_bones)
+    root_rot = RQuaternion(RVector4(0,0,0,1))
+    root_tra = RVector3(0,0,0)
+    root_sca = RVector3(1,1,1)
+    t = time.perf_counter()
+    for i in range(0, num_frames):
+        link.apply_world_fk_pose(actor, actor.skin_tree, pose_data, [], root_rot, root_tra, root_sca)
+    recursive_time = time.perf_counter() - t
+    t = time.perf_counter()
+    actor.update_retarget_plan()
+    plan = actor.retarget_plan
+    build_time = time.perf_counter() - t
+    t = time.perf_counter()
+    for i in range(0, num_frames):
+        link.apply_retarget_plan(actor, plan, pose_data, [])
+    plan_time = time.perf_counter() - t
+    print(f"{num_bones} bones, {num_frames} frames: recursive: {recursive_time*1000:.1f}ms, "
+          f"plan: {plan_time*1000:.1f}ms (+ {build_time*1000:.1f}ms build)")
+
+
+def euler_golden_test(count=1000, tolerance=1e-4, seed=0, gimbal_band=0.9999):
+    """Compares the batched quaternion to XYZ euler conversion with RLPy's ToEulerAngle,
+       on random rotations and on the gimbal lock and axis aligned edge cases.
+       The angles must match (modulo 2 pi), except within gimbal_band of Y = +/-90 degrees
+       where only the rotations they produce are compared."""
+    rnd = random.Random(seed)
+    quats = []
+    for i in range(0, count):
+        q = [ rnd.random() - 0.5 for j in range(0, 4) ]
+        l = math.sqrt(sum(v*v for v in q))
+        quats.append(tuple(v / l for v in q))
+    s = math.sqrt(0.5)
+    for a in [0.0, 0.3, -1.2, 2.5]:
+        # +/-90 degrees about Y, combined with a rotation about X
+        quats.append((math.sin(a/2)*s, s*math.cos(a/2), -math.sin(a/2)*s, math.cos(a/2)*s))
+        quats.append((math.sin(a/2)*s, -s*math.cos(a/2), math.sin(a/2)*s, math.cos(a/2)*s))
+    quats.extend([(0.0, 0.0, 0.0, 1.0), (1.0, 0.0, 0.0, 0.0), (0.0, 1.0, 0.0, 0.0), (0.0, 0.0, 1.0, 0.0)])
+    t = time.perf_counter()
+    eulers = kinematics.quats_to_euler_xyz(quats)
+    batch_time = time.perf_counter() - t
+    angle_error = 0.0
+    gimbal_error = 0.0
+    num_gimbal = 0
+    t = time.perf_counter()
+    for q, euler in zip(quats, eulers):
+        M: RMatrix3 = RQuaternion(RVector4(q[0], q[1], q[2], q[3])).ToRotationMatrix()
+        x = y = z = 0
+        golden = M.ToEulerAngle(EEulerOrder_XYZ, x, y, z)
+        if abs(2.0 * (q[0]*q[2] - q[3]*q[1])) >= gimbal_band:
+            # gimbal lock angles are not unique, compare the rotations they produce
+            num_gimbal += 1
+            R = euler_xyz_to_matrix(euler)
+            G = euler_xyz_to_matrix(golden)
+            gimbal_error = max(gimbal_error, max(abs(R[i][j] - G[i][j]) for i in range(3) for j in range(3)))
+        else:
+            angle_error = max(angle_error, max(abs(angle_difference(euler[i], golden[i])) for i in range(3)))
+    rlpy_time = time.perf_counter() - t
+    result = "PASS" if angle_error < tolerance and gimbal_error < tolerance else "FAIL"
+    print(f"Euler XYZ: {len(quats)} rotations, max angle error: {angle_error}, "
+          f"max gimbal lock ({num_gimbal}) matrix error: {gimbal_error} {result}, "
+          f"batch: {batch_time*1000:.2f}ms, RLPy (with check): {rlpy_time*1000:.2f}ms")
+
+
+def angle_difference(a, b):
+    """a - b wrapped to [-pi, pi)"""
+    return (a - b + math.pi) % (2.0 * math.pi) - math.pi
+
+
+def euler_xyz_to_matrix(euler):
+    cx, sx = math.cos(euler[0]), math.sin(euler[0])
+    cy, sy = math.cos(euler[1]), math.sin(euler[1])
+    cz, sz = math.cos(euler[2]), math.sin(euler[2])
+    # Rz * Ry * Rx
+    return [[cz*cy, cz*sy*sx - sz*cx, cz*sy*cx + sz*sx],
+            [sz*cy, sz*sy*sx + cz*cx, sz*sy*cx - cz*sx],
+            [-sy, cy*sx, cy*cx]]
+
+
+def control_handles_benchmark(num_frames=100):
+    """Keys the skin bones of the selected character's clip, looking up the transform controls
+       every frame vs. resolving them once. Overwrites the clip keys: use a copy of a recorded sequence.
+       Per bone per frame the lookup makes 22 RLPy calls (GetControl, GetDataBlock, 11 GetControl, 9 SetValue)
+       and the handles 9 SetValue: with free API calls (no CC/iC) both take the same ~1.1ms / 100 bone frames,
+       so the gain is the 13 RLPy lookups saved, which has to be measured in CC/iC."""
+    from . import link
+    for obj in RScene.GetSelectedObjects():
+        SC = cc.safe_get_skeleton_component(obj)
+        clip = SC.GetClip(0) if SC else None
+        if not clip:
+            continue
+        bones = [ bone for bone in SC.GetSkinBones() if bone.GetName() ]
+        fps: RFps = link.get_local_fps()
+        rot = RQuaternion(RVector4(0,0,0,1))
+        tra = RVector3(0,0,0)
+        sca = RVector3(1,1,1)
+        t = time.perf_counter()
+        for frame in range(0, num_frames):
+            frame_time = fps.IndexedFrameTime(frame)
+            for bone in bones:
+                link.set_bone_control(SC, clip, bone, frame_time, None, rot, tra, sca, rot, tra, sca)
+        lookup_time = time.perf_counter() - t
+        t = time.perf_counter()
+        handles = [ link.get_bone_control_handles(clip, bone) for bone in bones ]
+        resolve_time = time.perf_counter() - t
+        t = time.perf_counter()
+        for frame in range(0, num_frames):
+            frame_time = fps.IndexedFrameTime(frame)
+            for bone, controls in zip(bones, handles):
+                link.set_bone_control(SC, clip, bone, frame_time, None, rot, tra, sca, rot, tra, sca,
+                                      controls=controls)
+        handles_time = time.perf_counter() - t
+        print(f"{obj.GetName()}: {len(bones)} bones, {num_frames} frames: lookup: {lookup_time*1000:.1f}ms, "
+              f"handles: {handles_time*1000:.1f}ms (+ {resolve_time*1000:.1f}ms resolve)")
+
+
+def ik_bake_benchmark(num_frames=100):
+    """Bakes the FK keys of the selected characters' clips (and their attached skinned props) to IK
+       once per frame, as the per frame sequence receive did, vs. once over the whole clip,
+       as the deferred bake does. Rebakes the clips: use a copy of a received sequence."""
+    from . import link
+    fps: RFps = link.get_local_fps()
+    for obj in RScene.GetSelectedObjects():
+        objects = [ obj ] + list(RScene.FindChildObjects(obj, EObjectType_Prop | EObjectType_Accessory))
+        SCs = []
+        for o in objects:
+            SC = cc.safe_get_skeleton_component(o)
+            if SC and SC.GetClip(0):
+                SCs.append(SC)
+        if not SCs:
+            continue
+        t = time.perf_counter()
+        for frame in range(0, num_frames):
+            frame_time = fps.IndexedFrameTime(frame)
+            for SC in SCs:
+                SC.BakeFkToIk(frame_time, False)
+        per_frame_time = time.perf_counter() - t
+        t = time.perf_counter()
+        for SC in SCs:
+            SC.BakeFkToIk(fps.IndexedFrameTime(0), True)
+        ranged_time = time.perf_counter() - t
+        print(f"{obj.GetName()}: {len(SCs)} skeletons, {num_frames} frames: per frame: {per_frame_time*1000:.1f}ms, "
+              f"deferred: {ranged_time*1000:.1f}ms")
+
+
+def fk_kernel_golden_test(num_bones=150, tolerance=1e-5):
+    """Compares the FK kernel local transforms with the RLPy calc_world/calc_local results"""
+    from . import link
+    actor, pose_data = make_stub_rig_actor(num_bones)
+    plan = link.build_retarget_plan(actor)
+    golden = {}
+    worlds = []
+    for i, step in enumerate(plan):
+        parent = step["parent"]
+        if parent > -1:
+            parent_world_rot, parent_world_tra, parent_world_sca = worlds[parent]
+        else:
+            parent_world_rot, parent_world_tra, parent_world_sca = RQuaternion(RVector4(0,0,0,1)), RVector3(0,0,0), RVector3(1,1,1)
+        if step["pose_index"] > -1:
+            world_tra, world_rot, world_sca = link.fetch_pose_transform(pose_data, step["pose_index"])
+            local_rot, local_tra, local_sca = link.calc_local(world_rot, world_tra, world_sca,
+                                                              parent_world_rot, parent_world_tra, parent_world_sca)
+            golden[i] = [local_tra.x, local_tra.y, local_tra.z,
+                         local_rot.x, local_rot.y, local_rot.z, local_rot.w,
+                         local_sca.x, local_sca.y, local_sca.z]
+            worlds.append((world_rot, world_tra, world_sca))
+        else:
+            worlds.append(link.calc_world(step["t_pose_rot"], step["t_pose_tra"], step["t_pose_sca"],
+                                          parent_world_rot, parent_world_tra, parent_world_sca))
+    for use_numpy in [False, True]:
+        if use_numpy and kinematics.np is None:
+            continue
+        kernel = kinematics.FKKernel([ step["parent"] for step in plan ],
+                                     [ step["pose_index"] for step in plan ],
+                                     [ step["t_pose"] for step in plan ],
+                                     use_numpy=use_numpy, force_numpy=use_numpy)
+        local_transforms = kernel.solve(pose_data)[0]
+        error = max(abs(a - b) for i in golden for a, b in zip(golden[i], local_transforms[i]))
+        result = "PASS" if error < tolerance else "FAIL"
+        print(f"FK kernel ({'numpy' if use_numpy else 'python'}): {len(golden)} bones, max error: {error} {result}")
+
+
 def test():
     dump_params()
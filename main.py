@@ -15,7 +15,7 @@
 # along with CC/iC-Blender-Pipeline-Plugin.  If not, see <https://www.gnu.org/licenses/>.
 
 import RLPy, os
-from btp import vars, prefs, error, options, utils, cc, qt, tests, importer, exporter, morph, link, gob
+from btp import vars, prefs, error, options, utils, cc, qt, flow, bake, kinematics, simplify, tests, importer, exporter, morph, link, gob
 
 rl_plugin_info = { "ap": "iClone", "ap_version": "8.0" }
 
@@ -190,7 +190,7 @@ def menu_reload():
     import importlib
     print("Reloading Scripts ...")
     running, visible = link.link_stop()
-    modules = [ vars, prefs, error, options, utils, cc, qt, tests, importer, exporter, morph, link, gob ]
+    modules = [ vars, prefs, error, options, utils, cc, qt, flow, bake, kinematics, simplify, tests, importer, exporter, morph, link, gob ]
     cc_state = cc.unregister()
     for module in modules:
         importlib.reload(module)